@@ -152,4 +152,15 @@ CORS_ALLOWED_ORIGINS = [
     'https://route-connect.vercel.app',
     'https://route-connect-git-main-sedatuygurs-projects.vercel.app',
     # other origins...
-]
\ No newline at end of file
+]
+# Precomputed terminal-to-terminal lanes (see `python manage.py build_lane_matrix`).
+# LANE_SITES_FILE lists one address per line; the matrices are written to LANE_MATRIX_DIR.
+LANE_SITES_FILE = os.getenv("LANE_SITES_FILE", default=str(BASE_DIR / "lane_sites.txt"))
+LANE_MATRIX_DIR = os.getenv("LANE_MATRIX_DIR", default=str(BASE_DIR / "lane_matrix"))
+
+# Cold storage for closed trips (see `python manage.py archive_trips`).
+TRIP_ARCHIVE_DIR = os.getenv("TRIP_ARCHIVE_DIR", default=str(BASE_DIR / "archive"))
+
+# Load heavy dependencies (timezonefinder, numpy) when the app starts instead of on first use.
+# Enable it when a parent process forks the workers (e.g. gunicorn --preload) so they share them.
+PRELOAD_HEAVY_MODULES = os.getenv("PRELOAD_HEAVY_MODULES", default="false").lower() == "true"
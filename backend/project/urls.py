@@ -17,12 +17,15 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
-from trip.views import TripViewSet
+from trip.views import DailyLogViewSet, DriverViewSet, TripViewSet, calculate_route_events
 
 router = DefaultRouter()
 router.register(r'trips', TripViewSet, basename='trip')
+router.register(r'drivers', DriverViewSet, basename='driver')
+router.register(r'logs', DailyLogViewSet, basename='log')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/trips/<int:pk>/calculate_route/events/', calculate_route_events, name='trip-calculate-route-events'),
     path('api/', include(router.urls)),
 ]
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class TripConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trip'
+
+    def ready(self):
+        if settings.PRELOAD_HEAVY_MODULES:
+            from .services.route_and_hos_service import preload_heavy_modules
+            preload_heavy_modules()
@@ -0,0 +1,38 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+from trip.models import Trip
+from trip.services.archive import archive_trip
+
+class Command(BaseCommand):
+    help = (
+        "Moves the stops, daily logs and geometry of closed trips (dropoff finished more than "
+        "--days ago) to gzip-compressed cold storage. Archived trips are restored when read."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90,
+                            help="Archive trips whose last stop ended more than this many days ago.")
+        parser.add_argument("--limit", type=int, default=None,
+                            help="Archive at most this many trips.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options["days"])
+        trips = (
+            Trip.objects
+            .filter(archived_at__isnull=True)
+            .annotate(last_stop_end=Max('stops__end_time'))
+            .filter(last_stop_end__lt=cutoff)
+            .order_by('id')
+        )
+        if options["limit"] is not None:
+            trips = trips[:options["limit"]]
+
+        archived = 0
+        for trip in trips.iterator():
+            # A trip archived or re-planned by a concurrent run is skipped.
+            archived += archive_trip(trip)
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} trips closed before {cutoff:%Y-%m-%d}."))
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from trip.services.lane_matrix import load_lane_matrix, normalize_address, save_lane_matrix
+from trip.services.map_api_client import geocode_address, get_matrix_data, get_route_for_coordinates
+from trip.services.route_and_hos_service import get_timezone_finder
+
+# The ORS matrix endpoint limits the number of cells (sources x destinations) per request.
+MATRIX_MAX_CELLS = 3500
+
+class Command(BaseCommand):
+    help = (
+        "Resolves the configured site list into distance/duration matrices stored as memory-mapped "
+        "NumPy files. Only lanes to and from sites that are not in the matrix yet are computed. "
+        "The matrix holds no road geometry: trips planned from it keep the road geometry they "
+        "already have for the same sites, otherwise their map shows a straight line between them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sites", default=settings.LANE_SITES_FILE,
+                            help="File with one site address per line.")
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Drop the existing matrix and resolve every lane again.")
+        parser.add_argument("--directions", action="store_true",
+                            help="Resolve lanes one by one with the directions API instead of the matrix API.")
+
+    def handle(self, *args, **options):
+        addresses = self.read_sites(options["sites"])
+
+        sites, distance, duration = (None, None, None) if options["rebuild"] else load_lane_matrix()
+        sites = list(sites or [])
+        known = {normalize_address(site["address"]) for site in sites}
+        new_addresses = [address for address in addresses if normalize_address(address) not in known]
+
+        if not new_addresses:
+            self.stdout.write("Lane matrix is up to date.")
+            return
+
+        tf = get_timezone_finder()
+        for address in new_addresses:
+            coordinates = geocode_address(address)
+            sites.append({
+                "address": address,
+                "coordinates": coordinates,
+                "timezone": tf.timezone_at(lng=coordinates[0], lat=coordinates[1]) or "America/New_York",
+            })
+
+        # Grow the matrices; existing lanes are copied, new ones start unknown (NaN).
+        old_size = 0 if distance is None else distance.shape[0]
+        size = len(sites)
+        new_distance = np.full((size, size), np.nan, dtype=np.float32)
+        new_duration = np.full((size, size), np.nan, dtype=np.float32)
+        if old_size:
+            new_distance[:old_size, :old_size] = distance
+            new_duration[:old_size, :old_size] = duration
+        np.fill_diagonal(new_distance, 0)
+        np.fill_diagonal(new_duration, 0)
+
+        new_indices = list(range(old_size, size))
+        all_indices = list(range(size))
+        if options["directions"] or not os.getenv("ORS_API_MATRIX_URL"):
+            self.resolve_with_directions(sites, new_indices, new_distance, new_duration)
+        elif not old_size:
+            self.resolve_with_matrix(sites, all_indices, all_indices, new_distance, new_duration)
+        else:
+            # Rows from the new sites to every site, then columns from every site to the new ones.
+            self.resolve_with_matrix(sites, new_indices, all_indices, new_distance, new_duration)
+            self.resolve_with_matrix(sites, all_indices, new_indices, new_distance, new_duration)
+
+        save_lane_matrix(sites, new_distance, new_duration)
+        self.stdout.write(self.style.SUCCESS(
+            f"Lane matrix has {size} sites ({len(new_addresses)} added, "
+            f"{int(np.isnan(new_distance).sum())} unknown lanes)."
+        ))
+
+    def read_sites(self, path):
+        try:
+            with open(path) as sites_file:
+                lines = [line.strip() for line in sites_file]
+        except FileNotFoundError:
+            raise CommandError(f"Site list not found: {path}")
+
+        return [line for line in lines if line and not line.startswith("#")]
+
+    def resolve_with_matrix(self, sites, sources, destinations, distance, duration):
+        locations = [site["coordinates"] for site in sites]
+        chunk_size = max(1, MATRIX_MAX_CELLS // len(destinations))
+
+        for start in range(0, len(sources), chunk_size):
+            chunk = sources[start:start + chunk_size]
+            data = get_matrix_data(locations, chunk, destinations)
+            rows = np.array(data["distances"], dtype=np.float64)
+            hours = np.array(data["durations"], dtype=np.float64)
+            distance[np.ix_(chunk, destinations)] = rows
+            duration[np.ix_(chunk, destinations)] = hours
+
+    def resolve_with_directions(self, sites, new_indices, distance, duration):
+        new = set(new_indices)
+
+        for i, origin in enumerate(sites):
+            for j, destination in enumerate(sites):
+                if i == j or (i not in new and j not in new):
+                    continue
+                try:
+                    # Sites are geocoded once when they are added; only the route is requested.
+                    route = get_route_for_coordinates(origin["coordinates"], destination["coordinates"])
+                except Exception as e:
+                    self.stderr.write(f"Lane {origin['address']} -> {destination['address']} failed: {e}")
+                    continue
+                distance[i, j] = route["distance"]
+                duration[i, j] = route["duration"]
@@ -0,0 +1,112 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.utils import DatabaseError
+from trip.models import DailyLog, Stop, Trip
+
+class Command(BaseCommand):
+    help = (
+        "PostgreSQL only, optional: turns the daily log and stop tables into tables range-partitioned "
+        "by month (DailyLog.date / Stop.start_time) and creates the partitions for the coming months. "
+        "Run it again periodically (e.g. monthly) to keep partitions ahead of the data. "
+        "PostgreSQL requires the partition key in every unique index, so afterwards id is no longer "
+        "the primary key: ids still come from the identity sequence, and only (id, date) / "
+        "(id, start_time) is enforced unique."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=3,
+                            help="Create partitions up to this many months after the current one.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Table partitioning is only supported on PostgreSQL.")
+
+        this_month = datetime.date.today().replace(day=1)
+        last_month = self.add_months(this_month, options["months_ahead"])
+
+        for model, field_name in ((DailyLog, "date"), (Stop, "start_time")):
+            table = model._meta.db_table
+            column = model._meta.get_field(field_name).column
+
+            with transaction.atomic():
+                if not self.is_partitioned(table):
+                    self.convert(table, column)
+                    self.stdout.write(f"Converted {table} into a table partitioned by {column}.")
+                self.create_partitions(table, this_month, last_month)
+
+        self.stdout.write(self.style.SUCCESS("Partitions are up to date."))
+
+    def is_partitioned(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [table])
+            return cursor.fetchone() is not None
+
+    def convert(self, table, column):
+        """
+        Rebuilds the table as a partitioned table with the same columns and ids. The partition key
+        must be part of every unique constraint, so id is no longer the primary key: the identity
+        column still hands out unique ids, a unique index on (id, column) is the only one enforced,
+        and an index on id keeps lookups by id fast.
+        """
+        old_table = f"{table}_unpartitioned"
+        trip_table = Trip._meta.db_table
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old_table}"')
+            cursor.execute(
+                f'CREATE TABLE "{table}" (LIKE "{old_table}" INCLUDING DEFAULTS INCLUDING IDENTITY) '
+                f'PARTITION BY RANGE ("{column}")'
+            )
+            cursor.execute(f'SELECT MIN("{column}"), MAX("{column}"), MAX(id) FROM "{old_table}"')
+            first_value, last_value, max_id = cursor.fetchone()
+
+            # Partitions for every month that already holds data, then a default partition for the rest.
+            if first_value is not None:
+                self.create_partitions(table, self.month_of(first_value), self.month_of(last_value))
+            cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+            cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old_table}"')
+            cursor.execute(f'DROP TABLE "{old_table}"')
+            cursor.execute(
+                "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, false)", [table, (max_id or 0) + 1]
+            )
+
+            cursor.execute(f'CREATE UNIQUE INDEX "{table}_id_{column}_uniq" ON "{table}" (id, "{column}")')
+            cursor.execute(f'CREATE INDEX "{table}_id_idx" ON "{table}" (id)')
+            cursor.execute(f'CREATE INDEX "{table}_trip_id_idx" ON "{table}" (trip_id)')
+            cursor.execute(
+                f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_trip_id_fk" FOREIGN KEY (trip_id) '
+                f'REFERENCES "{trip_table}" (id) DEFERRABLE INITIALLY DEFERRED'
+            )
+
+    def create_partitions(self, table, first_month, last_month):
+        """
+        Creates the monthly partitions from first_month to last_month (inclusive) that do not exist yet.
+        """
+        month = first_month
+
+        with connection.cursor() as cursor:
+            while month <= last_month:
+                next_month = self.add_months(month, 1)
+                partition = f"{table}_p{month:%Y%m}"
+                try:
+                    with transaction.atomic():
+                        cursor.execute(
+                            f'CREATE TABLE IF NOT EXISTS "{partition}" PARTITION OF "{table}" '
+                            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+                        )
+                except DatabaseError as e:
+                    # Typically rows for this month already landed in the default partition.
+                    self.stderr.write(f"Could not create {partition}: {e}")
+                month = next_month
+
+    def month_of(self, value):
+        if isinstance(value, datetime.datetime):
+            value = value.date()
+        return value.replace(day=1)
+
+    def add_months(self, month, count):
+        index = month.year * 12 + month.month - 1 + count
+        return datetime.date(index // 12, index % 12 + 1, 1)
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0003_trip_commodity_trip_home_terminal_address_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Driver',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('name', models.CharField(max_length=255)),
+                ('timezone', models.CharField(blank=True, max_length=64)),
+                ('hos_state', models.JSONField(blank=True, default=dict)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='driver',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trips', to='trip.driver'),
+        ),
+    ]
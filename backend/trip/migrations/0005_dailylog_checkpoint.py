@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0004_driver'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailylog',
+            name='checkpoint',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
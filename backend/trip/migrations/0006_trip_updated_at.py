@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-19 19:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0005_dailylog_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0006_trip_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
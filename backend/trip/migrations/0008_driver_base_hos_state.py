@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0007_trip_archived_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driver',
+            name='base_hos_state',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0008_driver_base_hos_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='archived_last_log_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
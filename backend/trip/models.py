@@ -1,11 +1,29 @@
 from django.db import models
 
 # Create your models here.
+class Driver(models.Model):
+    """
+    A driver whose trips are scheduled back to back.
+    hos_state holds the HOS counters (rolling on-duty window, daily counters, 30-min break flag)
+    at the end of the driver's last scheduled trip, so the next trip can start from it.
+    base_hos_state holds them before the driver's first scheduled trip, so the schedule can be re-planned.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    name = models.CharField(max_length=255)
+    timezone = models.CharField(max_length=64, blank=True)  # e.g. "America/Chicago"; empty = start location's timezone
+    hos_state = models.JSONField(default=dict, blank=True)
+    base_hos_state = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"Driver {self.id} ({self.name})"
+
 class Trip(models.Model):
     """
     Stores the basic trip info.
     """
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Bumped whenever the route, stops or logs are rewritten
+    driver = models.ForeignKey(Driver, on_delete=models.SET_NULL, null=True, blank=True, related_name='trips')
     current_location = models.CharField(max_length=255)
     pickup_location = models.CharField(max_length=255)
     dropoff_location = models.CharField(max_length=255)
@@ -13,6 +31,9 @@ class Trip(models.Model):
     total_distance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     estimated_duration = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     geometry = models.JSONField(default=list, blank=True)  # Store the route geometry as a list of coordinates
+    # Set when the stops, logs and geometry were moved to cold storage (see services/archive.py)
+    archived_at = models.DateTimeField(null=True, blank=True)
+    archived_last_log_date = models.DateField(null=True, blank=True)  # Date of the last archived daily log
 
     # Additional fields: name of carrier, main office address, etc.
     name_of_carrier = models.CharField(max_length=255, blank=True)
@@ -52,6 +73,8 @@ class DailyLog(models.Model):
     # Optionally store JSON events for the day
     # Each event includes: start_time, end_time, status, remarks (city, state, reason)
     events = models.JSONField(default=list, blank=True)
+    # HOS state and fuel bookkeeping at the start of the day, used to replan the trip mid-route
+    checkpoint = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"DailyLog {self.id} for {self.date}"
\ No newline at end of file
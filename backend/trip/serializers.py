@@ -1,5 +1,19 @@
 from rest_framework import serializers
-from .models import DailyLog, Stop, Trip
+from .models import DailyLog, Driver, Stop, Trip
+
+class SparseFieldsMixin:
+    """
+    Limits the serialized fields to the comma-separated ?fields= query parameter of the request.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request.query_params.get('fields') if request else None
+
+        if fields:
+            requested = set(fields.split(','))
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
 
 class StopSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,12 +23,143 @@ class StopSerializer(serializers.ModelSerializer):
 class DailyLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = DailyLog
-        fields = '__all__'
+        exclude = ['checkpoint']
 
-class TripSerializer(serializers.ModelSerializer):
+class TripSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     stops = StopSerializer(many=True, read_only=True)
     logs = DailyLogSerializer(many=True, read_only=True)
 
     class Meta:
         model = Trip
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        # Set by archiving and by scheduling (see services/archive.py and services/driver_scheduler.py)
+        read_only_fields = ['archived_at', 'archived_last_log_date', 'driver']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+
+        # An archived trip's rows are in cold storage: they are null, not empty, until the trip
+        # is read on its own (GET /api/trips/{id}/), which restores them.
+        if instance.archived_at is not None:
+            for name in ('stops', 'logs', 'geometry'):
+                if name in data:
+                    data[name] = None
+
+        return data
+
+class TripGeometrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Trip
+        fields = ['id', 'geometry']
+
+class DriverSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Driver
+        fields = '__all__'
+        read_only_fields = ['hos_state', 'base_hos_state']
+
+def validate_schedule_trips(driver, trips):
+    """
+    Checks the trips of one driver's batch:
+      - every trip appears once,
+      - trips scheduled for another driver are rejected, since that driver's HOS state counts them,
+      - trips already scheduled for the driver re-plan the driver's schedule from the state before it,
+        so they can only be scheduled together with all of the driver's other trips.
+    """
+    requested = {trip.id for trip in trips}
+    if len(requested) != len(trips):
+        raise serializers.ValidationError({'trips': "Each trip can only be scheduled once."})
+
+    taken = sorted(trip.id for trip in trips if trip.driver_id not in (None, driver.id))
+    if taken:
+        raise serializers.ValidationError({'trips': f"Trips {taken} are scheduled for another driver."})
+
+    scheduled = set(driver.trips.values_list('id', flat=True))
+
+    if scheduled & requested and not scheduled <= requested:
+        raise serializers.ValidationError(
+            {'trips': "Re-planning a driver's schedule requires all of the driver's trips."}
+        )
+
+class DriverScheduleSerializer(serializers.Serializer):
+    """
+    Input of DriverViewSet.schedule: the trips to chain for one driver, in driving order.
+    If trips is omitted, all of the driver's trips are re-planned in creation order.
+    The driver is passed in the context.
+    """
+    trips = serializers.PrimaryKeyRelatedField(queryset=Trip.objects.all(), many=True, required=False)
+    start_time = serializers.DateTimeField(required=False)
+    use_sleeper_berth = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if 'trips' in data:
+            validate_schedule_trips(self.context['driver'], data['trips'])
+        return data
+
+class DriverAssignmentSerializer(serializers.Serializer):
+    driver = serializers.PrimaryKeyRelatedField(queryset=Driver.objects.all())
+    trips = serializers.PrimaryKeyRelatedField(queryset=Trip.objects.all(), many=True)
+    start_time = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        validate_schedule_trips(data['driver'], data['trips'])
+        return data
+
+class FleetScheduleSerializer(serializers.Serializer):
+    """
+    Input of DriverViewSet.schedule_batch: one assignment per driver.
+    """
+    assignments = DriverAssignmentSerializer(many=True)
+    use_sleeper_berth = serializers.BooleanField(default=False)
+
+    def validate_assignments(self, assignments):
+        drivers = [assignment['driver'].id for assignment in assignments]
+        if len(set(drivers)) != len(drivers):
+            raise serializers.ValidationError("Each driver can only be assigned once.")
+
+        trips = [trip.id for assignment in assignments for trip in assignment['trips']]
+        if len(set(trips)) != len(trips):
+            raise serializers.ValidationError("Each trip can only be assigned to one driver.")
+
+        return assignments
+
+class DepartureSweepSerializer(serializers.Serializer):
+    """
+    Input of TripViewSet.optimize_departure: the candidate departure window and the
+    receiving window at the dropoff (both receiving bounds are optional).
+    """
+    MAX_STEPS = 2000
+
+    earliest_departure = serializers.DateTimeField()
+    latest_departure = serializers.DateTimeField()
+    step_minutes = serializers.IntegerField(default=30, min_value=5)
+    window_start = serializers.DateTimeField(required=False)
+    window_end = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        span = data['latest_departure'] - data['earliest_departure']
+        if span.total_seconds() < 0:
+            raise serializers.ValidationError("latest_departure must not be before earliest_departure.")
+        if span.total_seconds() / 60 / data['step_minutes'] > self.MAX_STEPS:
+            raise serializers.ValidationError(f"The departure window allows at most {self.MAX_STEPS} steps.")
+        return data
+
+class TripReplanSerializer(serializers.Serializer):
+    """
+    Input of TripViewSet.replan: the driver's reported position and when it was reported (default: now).
+    """
+    current_location = serializers.CharField(max_length=255)
+    at_time = serializers.DateTimeField(required=False)
+    use_sleeper_berth = serializers.BooleanField(default=True)
+
+class LogExportSerializer(serializers.Serializer):
+    """
+    Query parameters of DailyLogViewSet.export. All filters are optional and combined.
+    Logs are exported by date, followed by the logs of archived trips by trip and date.
+    """
+    driver = serializers.PrimaryKeyRelatedField(queryset=Driver.objects.all(), required=False)
+    trip = serializers.PrimaryKeyRelatedField(queryset=Trip.objects.all(), required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    output = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+    grid = serializers.BooleanField(default=False)
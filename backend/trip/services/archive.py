@@ -0,0 +1,157 @@
+import datetime
+import gzip
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from ..models import DailyLog, Stop, Trip
+
+logger = logging.getLogger(__name__)
+
+STOP_FIELDS = ['id', 'stop_type', 'location', 'start_time', 'end_time']
+LOG_FIELDS = [
+    'id', 'date', 'total_driving', 'total_on_duty', 'total_off_duty',
+    'total_sleeper_berth', 'events', 'checkpoint',
+]
+
+class ArchiveJSONEncoder(DjangoJSONEncoder):
+    """
+    Keeps the microseconds of datetimes, which DjangoJSONEncoder cuts to milliseconds, so
+    rehydrated stops start and end exactly where they did.
+    """
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+def archive_path(trip_id):
+    return os.path.join(settings.TRIP_ARCHIVE_DIR, f"trip-{trip_id}.json.gz")
+
+def remove_archive(trip_id):
+    try:
+        os.remove(archive_path(trip_id))
+    except FileNotFoundError:
+        pass
+
+def read_archive(trip_id):
+    """
+    Returns the archived {"geometry", "stops", "logs"} document of a trip.
+    """
+    with gzip.open(archive_path(trip_id), "rt", encoding="utf-8") as archive_file:
+        return json.load(archive_file)
+
+def archive_trip(trip):
+    """
+    Moves the stops, daily logs and geometry of a trip to a gzip-compressed JSON file and
+    removes them from the hot tables. The Trip row itself stays, with archived_at set.
+
+    The trip's row is locked while its rows are read, written out and deleted, so a concurrent
+    archive, rehydration or re-plan of the same trip waits. Returns False if the trip was archived
+    in the meantime.
+    """
+    os.makedirs(settings.TRIP_ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(trip.id)
+    written = False
+
+    try:
+        with transaction.atomic():
+            locked = (
+                Trip.objects.select_for_update()
+                .filter(pk=trip.pk, archived_at__isnull=True)
+                .values('geometry')
+                .first()
+            )
+            if locked is None:
+                return False
+
+            document = {
+                "geometry": locked["geometry"],
+                "stops": list(trip.stops.order_by('id').values(*STOP_FIELDS)),
+                "logs": list(trip.logs.order_by('id').values(*LOG_FIELDS)),
+            }
+
+            # Write next to the target and swap in, so a crash never leaves a truncated archive.
+            with gzip.open(f"{path}.tmp", "wt", encoding="utf-8") as archive_file:
+                json.dump(document, archive_file, cls=ArchiveJSONEncoder, separators=(",", ":"))
+            os.replace(f"{path}.tmp", path)
+            written = True
+
+            trip.stops.all().delete()
+            trip.logs.all().delete()
+            trip.geometry = []
+            trip.archived_at = timezone.now()
+            # Lets the log export skip archives that end before the requested range.
+            trip.archived_last_log_date = max((log['date'] for log in document['logs']), default=None)
+            trip.save(update_fields=['geometry', 'archived_at', 'archived_last_log_date', 'updated_at'])
+    except Exception:
+        # The rows are still in the hot tables, so the file must not be restored later.
+        if written:
+            remove_archive(trip.id)
+        raise
+
+    return True
+
+def rehydrate_trip(trip):
+    """
+    Restores an archived trip into the hot tables (with its original ids) and removes the archive.
+    Concurrent calls for the same trip wait on the trip's row lock; only the first one restores it.
+    """
+    with transaction.atomic():
+        if not Trip.objects.select_for_update().filter(pk=trip.pk, archived_at__isnull=False).exists():
+            return
+
+        document = read_archive(trip.id)
+        Stop.objects.bulk_create(Stop(trip=trip, **stop) for stop in document["stops"])
+        DailyLog.objects.bulk_create(DailyLog(trip=trip, **log) for log in document["logs"])
+        trip.geometry = document["geometry"]
+        trip.archived_at = None
+        trip.archived_last_log_date = None
+        trip.save(update_fields=['geometry', 'archived_at', 'archived_last_log_date', 'updated_at'])
+        transaction.on_commit(lambda: remove_archive(trip.id))
+
+def discard_archives(trips):
+    """
+    Drops the archives of trips whose stops and daily logs are being replaced by a new plan, so a
+    later read does not restore the old rows next to the new ones. Must run inside the caller's
+    transaction; the files are removed once it commits.
+
+    Every trip's row is locked (in id order), so the new plan waits for an archive in progress.
+    """
+    locked = (
+        Trip.objects.select_for_update()
+        .filter(pk__in=[trip.pk for trip in trips])
+        .order_by('id')
+        .values_list('id', 'archived_at')
+    )
+    trip_ids = [trip_id for trip_id, archived_at in locked if archived_at is not None]
+    # Instances loaded before a concurrent rehydration may still carry archived_at.
+    for trip in trips:
+        trip.archived_at = None
+        trip.archived_last_log_date = None
+
+    Trip.objects.filter(pk__in=trip_ids).update(archived_at=None, archived_last_log_date=None)
+    for trip_id in trip_ids:
+        transaction.on_commit(lambda trip_id=trip_id: remove_archive(trip_id))
+
+def iter_archived_logs(trips, start=None, end=None):
+    """
+    Yields unsaved DailyLog instances of archived trips, one trip at a time, optionally
+    limited to the start/end date range. The hot tables are not touched.
+    Trips whose archive file is missing are skipped with a warning.
+    """
+    for trip in trips:
+        try:
+            document = read_archive(trip.id)
+        except FileNotFoundError:
+            logger.warning("Archive of trip %s not found, its logs are skipped.", trip.id)
+            continue
+
+        for log in document["logs"]:
+            log = DailyLog(trip=trip, **dict(log, date=parse_date(log["date"])))
+            if (start is None or log.date >= start) and (end is None or log.date <= end):
+                yield log
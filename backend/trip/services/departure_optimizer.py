@@ -0,0 +1,156 @@
+import datetime
+
+from .route_and_hos_service import (
+    ROLLING_WINDOW,
+    UTC,
+    deserialize_hos_state,
+    get_zone,
+    new_hos_state,
+    resume_hos_state,
+    simulate_trip,
+)
+
+def simulation_key(total_distance, use_sleeper_berth, hos_state, start):
+    """
+    Returns what the timing of a simulation starting at start (UTC) depends on: the HOS state
+    relative to the start. On-duty periods that started before the rolling window never count
+    again, and the daily off-duty and sleeper hours only appear in the logs.
+    """
+    cutoff = start - ROLLING_WINDOW
+
+    return (
+        total_distance,
+        use_sleeper_berth,
+        tuple((period_start - start, period_end - start)
+              for period_start, period_end in hos_state["on_duty_periods"] if period_start >= cutoff),
+        hos_state["daily_driving_hours"],
+        hos_state["daily_on_duty_hours"],
+        hos_state["has_taken_30min_break"],
+    )
+
+def evaluate_departure(total_distance, departure, use_sleeper_berth, hos_state, cache=None):
+    """
+    Simulates one (departure, use_sleeper_berth) candidate and returns a summary of the plan.
+    hos_state is the driver's state before the trip.
+
+    The simulation steps in UTC with exact timedelta arithmetic, so two candidates with the same
+    simulation_key get the same plan shifted by the difference of their start times. cache
+    (optional) is a dict shared by the candidates of a sweep: each key is simulated once and the
+    others are shifted from its offsets.
+    """
+    hos_state = resume_hos_state(hos_state, departure)
+    # The trip starts when the driver is free (see simulate_trip).
+    start = max(departure, hos_state["available_at"]).astimezone(UTC)
+    key = simulation_key(total_distance, use_sleeper_berth, hos_state, start)
+    offsets = cache.get(key) if cache is not None else None
+
+    if offsets is None:
+        plan = simulate_trip(
+            total_distance,
+            departure,
+            "",
+            "",
+            use_sleeper_berth,
+            hos_state,
+            record_events=False,
+        )
+        dropoff = plan['stops'][-1]
+        offsets = {
+            'dropoff_start': dropoff['start_time'] - start,
+            'dropoff_end': dropoff['end_time'] - start,
+            'end_time': plan['end_time'] - start,
+            'resets': plan['resets'],
+        }
+        if cache is not None:
+            cache[key] = offsets
+
+    return {
+        'departure': departure,
+        'use_sleeper_berth': use_sleeper_berth,
+        'dropoff_start': (start + offsets['dropoff_start']).astimezone(departure.tzinfo),
+        'dropoff_end': (start + offsets['dropoff_end']).astimezone(departure.tzinfo),
+        'resets': offsets['resets'],
+        'elapsed_hours': (start + offsets['end_time'] - departure).total_seconds() / 3600.0,
+    }
+
+def driver_hos_state(trip):
+    """
+    Returns the HOS state of the trip's driver at the start of the trip as scheduled (the
+    checkpoint of its first daily log), or None if the trip is not scheduled for a driver.
+    Departures before the scheduled start then wait until the driver is free.
+    """
+    if trip.driver_id is None:
+        return None
+
+    first_log = trip.logs.order_by('id').only('checkpoint').first()
+    if first_log is None or not first_log.checkpoint:
+        return None
+
+    return deserialize_hos_state(first_log.checkpoint["hos_state"])
+
+def pareto_front(results):
+    """
+    Keeps the plans that are not dominated on (resets, elapsed_hours): no other plan has
+    fewer-or-equal resets and a shorter-or-equal trip with at least one of them strictly better.
+    """
+    front = []
+    best_elapsed = None
+
+    # After sorting, a plan is dominated exactly when an earlier plan was at least as short.
+    for result in sorted(results, key=lambda r: (r['resets'], r['elapsed_hours'], r['departure'])):
+        if best_elapsed is None or result['elapsed_hours'] < best_elapsed:
+            front.append(result)
+            best_elapsed = result['elapsed_hours']
+
+    return front
+
+def optimize_departure(trip, route, earliest_departure, latest_departure, step_minutes=30,
+                       window_start=None, window_end=None):
+    """
+    Sweeps departure times between earliest_departure and latest_departure (every step_minutes),
+    with the sleeper berth option on and off, through the HOS simulation.
+
+    The route is resolved once by the caller (see resolve_route) and reused for every candidate.
+    Candidates start from the HOS state of the trip's driver (see driver_hos_state); without a
+    driver, the rolling window is seeded from trip.current_cycle_hours_used at each departure.
+    Plans whose dropoff does not start inside the receiving window (window_start/window_end,
+    either may be None) are discarded.
+
+    Candidates run in-process and share one simulation per simulation_key. Without a driver every
+    candidate has the same relative state, so the sweep runs one simulation per sleeper berth
+    option. With a driver, only departures in the 34 hours after the driver is free differ (later
+    ones all start after a full restart, earlier ones wait until the driver is free).
+
+    Returns a dictionary with:
+      - evaluated: number of simulated candidates,
+      - feasible: number of candidates that reach the dropoff inside the window,
+      - plans: Pareto-best feasible plans (fewest resets vs. shortest trip), best first.
+    """
+    effective_tz = get_zone(route['effective_tz'])
+    # Stepped in UTC, so the departures are evenly spaced across a DST change.
+    departure = earliest_departure.astimezone(UTC)
+    step = datetime.timedelta(minutes=step_minutes)
+    driver_state = driver_hos_state(trip)
+
+    results = []
+    cache = {}
+    while departure <= latest_departure:
+        local_departure = departure.astimezone(effective_tz)
+        hos_state = driver_state or new_hos_state(local_departure, trip.current_cycle_hours_used)
+        for use_sleeper_berth in (False, True):
+            results.append(
+                evaluate_departure(route['distance'], local_departure, use_sleeper_berth, hos_state, cache)
+            )
+        departure += step
+
+    feasible = [
+        result for result in results
+        if (window_start is None or result['dropoff_start'] >= window_start)
+        and (window_end is None or result['dropoff_start'] <= window_end)
+    ]
+
+    return {
+        'evaluated': len(results),
+        'feasible': len(feasible),
+        'plans': pareto_front(feasible),
+    }
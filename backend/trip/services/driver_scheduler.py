@@ -0,0 +1,203 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+from django.utils import timezone
+from .archive import discard_archives
+from .lane_matrix import lane_geometry
+from .route_and_hos_service import (
+    deserialize_hos_state,
+    get_zone,
+    new_hos_state,
+    resolve_route,
+    serialize_hos_state,
+    simulate_trip,
+)
+from ..models import DailyLog, Driver, Stop, Trip
+
+# Routes are resolved over the network, so a batch resolves them concurrently.
+ROUTE_WORKERS = 8
+
+def chain_trips(trips, routes, start_time, hos_state, use_sleeper_berth=False):
+    """
+    Simulates the trips one after the other without touching the database. The first trip starts
+    at start_time (or when the driver becomes available, whichever is later) with hos_state; every
+    following trip starts right after the previous dropoff and carries over the rolling 70-hour
+    window, the daily counters and the 30-minute break flag.
+
+    If hos_state is None, the rolling window is seeded from the first trip's current_cycle_hours_used.
+
+    Returns a list of (trip, route, plan) tuples and the final HOS state.
+    """
+    current_dt = start_time
+    plans = []
+
+    for trip in trips:
+        route = routes[trip.id]
+        current_dt = current_dt.astimezone(get_zone(route['effective_tz']))
+
+        if hos_state is None:
+            # No history for this driver yet: start from the cycle hours entered on the first trip.
+            hos_state = new_hos_state(current_dt, trip.current_cycle_hours_used)
+
+        plan = simulate_trip(
+            route['distance'],
+            current_dt,
+            trip.pickup_location,
+            trip.dropoff_location,
+            use_sleeper_berth,
+            hos_state,
+            timezone_name=route['effective_tz'],
+        )
+        plans.append((trip, route, plan))
+        hos_state = plan['state']
+        current_dt = plan['end_time']
+
+    return plans, hos_state
+
+def plan_driver_trips(driver, trips, routes, start_time=None, use_sleeper_berth=False):
+    """
+    Chains the given trips for one driver without touching the database (see chain_trips).
+
+    The first trip starts at start_time (default: now) or when the driver becomes available,
+    whichever is later, using the HOS state stored on the driver.
+
+    If the trips are already scheduled for the driver, the schedule is re-planned from the
+    state before it (Driver.base_hos_state), so repeating a request gives the same plan.
+
+    Parameters:
+      driver: Driver model instance.
+      trips: Trip model instances, in the order they are driven.
+      routes: dict of trip id -> resolved route (see resolve_route).
+
+    Returns a list of (trip, route, plan) tuples and the driver's final HOS state.
+    """
+    if any(trip.driver_id == driver.id for trip in trips):
+        hos_state = deserialize_hos_state(driver.base_hos_state)
+    else:
+        hos_state = deserialize_hos_state(driver.hos_state)
+
+    return chain_trips(trips, routes, start_time or timezone.now(), hos_state, use_sleeper_berth)
+
+def following_trips(trip):
+    """
+    Returns the trips of the trip's driver that are driven after it, in driving order
+    (the order DriverViewSet.schedule re-plans them in).
+    """
+    trips = list(trip.driver.trips.order_by('created_at', 'id'))
+    ids = [t.id for t in trips]
+    return trips[ids.index(trip.id) + 1:]
+
+def save_driver_plans(driver_plans):
+    """
+    Stores the plans of many drivers in one transaction.
+
+    Parameters:
+      driver_plans: list of (driver, plans, hos_state) as returned by plan_driver_trips.
+    """
+    trips = []
+    drivers = []
+    stops = []
+    logs = []
+    now = timezone.now()
+
+    for driver, plans, hos_state in driver_plans:
+        for trip, route, plan in plans:
+            trip.driver = driver
+            trip.total_distance = route['distance']
+            trip.estimated_duration = route['duration']
+            trip.geometry = lane_geometry(route, trip.geometry)
+            trip.updated_at = now
+            trips.append(trip)
+            stops.extend(Stop(trip=trip, **stop) for stop in plan['stops'])
+            logs.extend(DailyLog(trip=trip, **log) for log in plan['logs'])
+
+        if hos_state is not None:
+            driver.hos_state = serialize_hos_state(hos_state)
+            drivers.append(driver)
+
+    with transaction.atomic():
+        discard_archives(trips)
+        Trip.objects.bulk_update(trips, ['driver', 'total_distance', 'estimated_duration', 'geometry', 'updated_at'])
+        Driver.objects.bulk_update(drivers, ['hos_state', 'base_hos_state'])
+
+        # Clear old stops/logs
+        Stop.objects.filter(trip__in=trips).delete()
+        DailyLog.objects.filter(trip__in=trips).delete()
+
+        Stop.objects.bulk_create(stops)
+        DailyLog.objects.bulk_create(logs)
+
+def resolve_routes(assignments):
+    """
+    Resolves the routes of all trips in the assignments concurrently.
+    Returns a dict of trip id -> route and a dict of trip id -> error message for the trips
+    whose route could not be resolved (e.g. an address that cannot be geocoded).
+    """
+    jobs = {
+        trip.id: (trip, driver.timezone or None)
+        for driver, trips, _ in assignments
+        for trip in trips
+    }
+
+    def resolve(job):
+        try:
+            return resolve_route(*job), None
+        except Exception as e:
+            return None, str(e)
+
+    routes = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=ROUTE_WORKERS) as executor:
+        for trip_id, (route, error) in zip(jobs.keys(), executor.map(resolve, jobs.values())):
+            if error is None:
+                routes[trip_id] = route
+            else:
+                errors[trip_id] = error
+
+    return routes, errors
+
+def schedule_fleet(assignments, use_sleeper_berth=False):
+    """
+    Plans consecutive loads for many drivers in a single batch.
+
+    Parameters:
+      assignments: list of (driver, trips, start_time) tuples; start_time may be None (now).
+      use_sleeper_berth (bool): use the 7+3 sleeper berth reset instead of 10 hours off duty.
+
+    A driver with a trip whose route cannot be resolved is not planned; the other drivers are.
+
+    Returns a list of (driver, plans) tuples for the planned drivers and a list of
+    (driver, errors) tuples for the others, errors being a dict of trip id -> error message.
+    Stops, daily logs and each planned driver's HOS state are stored.
+    """
+    routes, route_errors = resolve_routes(assignments)
+    driver_plans = []
+    failures = []
+    scheduled_drivers = set(
+        Trip.objects.filter(driver__in=[driver for driver, _, _ in assignments]).values_list('driver_id', flat=True)
+    )
+
+    for driver, trips, start_time in assignments:
+        errors = {trip.id: route_errors[trip.id] for trip in trips if trip.id in route_errors}
+        if errors:
+            failures.append((driver, errors))
+            continue
+
+        if driver.id not in scheduled_drivers:
+            # The driver's schedule starts with this batch.
+            driver.base_hos_state = driver.hos_state
+        plans, hos_state = plan_driver_trips(driver, trips, routes, start_time, use_sleeper_berth)
+        driver_plans.append((driver, plans, hos_state))
+
+    save_driver_plans(driver_plans)
+    return [(driver, plans) for driver, plans, _ in driver_plans], failures
+
+def schedule_driver_trips(driver, trips, start_time=None, use_sleeper_berth=False):
+    """
+    Plans consecutive loads for a single driver (see schedule_fleet).
+    Returns a list of (trip, route, plan) tuples. Raises ValueError if a route cannot be resolved.
+    """
+    results, failures = schedule_fleet([(driver, trips, start_time)], use_sleeper_berth)
+    if failures:
+        raise ValueError("; ".join(failures[0][1].values()))
+    return results[0][1]
@@ -0,0 +1,116 @@
+import json
+import math
+import os
+
+from django.conf import settings
+
+SITES_FILE = "sites.json"
+DISTANCE_FILE = "distance.npy"
+DURATION_FILE = "duration.npy"
+
+# Degrees (about 5 km) within which a stored road geometry is taken to start and end at a lane's sites.
+ENDPOINT_TOLERANCE = 0.05
+
+# Loaded matrices of this process, reloaded when sites.json changes on disk.
+_cache = {"mtime": None, "index": None, "sites": None, "distance": None, "duration": None}
+
+def normalize_address(address):
+    return " ".join(address.split()).lower()
+
+def matrix_path(name):
+    return os.path.join(settings.LANE_MATRIX_DIR, name)
+
+def load_lane_matrix():
+    """
+    Returns (sites, distance, duration) where distance/duration are read-only memory-mapped
+    N x N float32 arrays (miles / hours, NaN for unknown lanes) shared through the page cache
+    by every worker. Returns (None, None, None) if no matrix has been built.
+    """
+    try:
+        mtime = os.stat(matrix_path(SITES_FILE)).st_mtime
+    except FileNotFoundError:
+        return None, None, None
+
+    if _cache["mtime"] != mtime:
+        # numpy is only needed once a matrix exists, so it is not imported at module load.
+        import numpy as np
+
+        with open(matrix_path(SITES_FILE)) as sites_file:
+            sites = json.load(sites_file)
+
+        _cache.update(
+            mtime=mtime,
+            sites=sites,
+            index={normalize_address(site["address"]): i for i, site in enumerate(sites)},
+            distance=np.load(matrix_path(DISTANCE_FILE), mmap_mode="r"),
+            duration=np.load(matrix_path(DURATION_FILE), mmap_mode="r"),
+        )
+
+    return _cache["sites"], _cache["distance"], _cache["duration"]
+
+def lookup_lane(origin, destination, driver_timezone=None):
+    """
+    Looks up a lane between two configured sites without any network I/O.
+
+    Returns a route dictionary in the format of resolve_route, or None if either address
+    is not a configured site or the lane is unknown.
+    """
+    sites, distance, duration = load_lane_matrix()
+    if sites is None:
+        return None
+
+    i = _cache["index"].get(normalize_address(origin))
+    j = _cache["index"].get(normalize_address(destination))
+    if i is None or j is None or math.isnan(distance[i, j]):
+        return None
+
+    start_tz_str = sites[i]["timezone"]
+
+    return {
+        'distance': float(distance[i, j]),
+        'duration': float(duration[i, j]),
+        # The matrix has no road geometry, only the sites (see lane_geometry).
+        'geometry': [sites[i]["coordinates"], sites[j]["coordinates"]],
+        'straight_line': True,
+        'start_tz': start_tz_str,
+        'dest_tz': sites[j]["timezone"],
+        'effective_tz': driver_timezone if driver_timezone else start_tz_str,
+    }
+
+def lane_geometry(route, previous_geometry):
+    """
+    Returns the geometry to store for a route. A lane from the matrix only has a straight line
+    between its sites, so a road geometry stored earlier for the same endpoints (e.g. from a plan
+    routed before the lane was added) is kept instead of being overwritten.
+    """
+    geometry = route['geometry']
+    if not route.get('straight_line') or not previous_geometry or len(previous_geometry) < 2:
+        return geometry
+
+    def close(a, b):
+        return abs(a[0] - b[0]) <= ENDPOINT_TOLERANCE and abs(a[1] - b[1]) <= ENDPOINT_TOLERANCE
+
+    if close(previous_geometry[0], geometry[0]) and close(previous_geometry[-1], geometry[-1]):
+        return previous_geometry
+    return geometry
+
+def save_lane_matrix(sites, distance, duration):
+    """
+    Writes the site list and matrices. Each file is written next to its target and swapped in
+    with os.replace, so workers that still map the previous files keep a consistent view;
+    sites.json goes last because its mtime triggers the reload.
+    """
+    import numpy as np
+
+    os.makedirs(settings.LANE_MATRIX_DIR, exist_ok=True)
+
+    for name, array in ((DISTANCE_FILE, distance), (DURATION_FILE, duration)):
+        tmp_path = matrix_path(f"{name}.tmp")
+        with open(tmp_path, "wb") as tmp_file:
+            np.save(tmp_file, array.astype(np.float32))
+        os.replace(tmp_path, matrix_path(name))
+
+    tmp_path = matrix_path(f"{SITES_FILE}.tmp")
+    with open(tmp_path, "w") as tmp_file:
+        json.dump(sites, tmp_file)
+    os.replace(tmp_path, matrix_path(SITES_FILE))
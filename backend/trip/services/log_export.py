@@ -0,0 +1,159 @@
+import csv
+import datetime
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from .archive import iter_archived_logs
+
+# Rows of the duty status grid on the paper log, top to bottom.
+GRID_STATUSES = ["Off Duty", "Sleeper Berth", "Driving", "On Duty"]
+MINUTES_PER_DAY = 1440
+
+# Logs are read from the database in chunks so memory stays flat for any date range.
+EXPORT_CHUNK_SIZE = 200
+
+CSV_HEADER = ["driver", "trip", "date", "start_time", "end_time", "status", "remarks"]
+
+def merge_events(events):
+    """
+    Merges consecutive 15-minute events with the same status and remarks into one event.
+    """
+    merged = []
+
+    for event in events:
+        last = merged[-1] if merged else None
+        if (last and last["status"] == event["status"] and last["remarks"] == event["remarks"]
+                and last["end_time"] == event["start_time"]):
+            last["end_time"] = event["end_time"]
+        else:
+            merged.append(dict(event))
+
+    return merged
+
+def build_log_grid(date, events):
+    """
+    Pre-computes the duty status grid of a daily log, the same way DailyLogPdf.tsx draws it:
+    one continuous timeline from midnight to midnight where gaps keep the previous status
+    (Off Duty before the first event).
+
+    Returns a dictionary with:
+      - segments: list of {start, end, status, row} with start/end in minutes from midnight
+        and row the grid row index (0=Off Duty, 1=Sleeper Berth, 2=Driving, 3=On Duty),
+      - status_minutes: total minutes per status (sums to 1440).
+    """
+    clipped = []
+
+    for event in events:
+        start = datetime.datetime.fromisoformat(event["start_time"])
+        end = datetime.datetime.fromisoformat(event["end_time"])
+        midnight = datetime.datetime.combine(date, datetime.time(), tzinfo=start.tzinfo)
+        start_minute = max(round((start - midnight).total_seconds() / 60, 2), 0)
+        end_minute = min(round((end - midnight).total_seconds() / 60, 2), MINUTES_PER_DAY)
+        if end_minute > start_minute:
+            clipped.append((start_minute, end_minute, event["status"]))
+
+    clipped.sort()
+
+    segments = []
+    previous_end = 0
+    previous_status = "Off Duty"
+
+    def add_segment(start, end, status):
+        if segments and segments[-1]["status"] == status and segments[-1]["end"] == start:
+            segments[-1]["end"] = end
+        else:
+            segments.append({"start": start, "end": end, "status": status, "row": GRID_STATUSES.index(status)})
+
+    for start, end, status in clipped:
+        if start > previous_end:
+            add_segment(previous_end, start, previous_status)
+        add_segment(max(start, previous_end), end, status)
+        previous_end = max(previous_end, end)
+        previous_status = status
+
+    if previous_end < MINUTES_PER_DAY:
+        add_segment(previous_end, MINUTES_PER_DAY, previous_status)
+
+    status_minutes = {status: 0 for status in GRID_STATUSES}
+    for segment in segments:
+        status_minutes[segment["status"]] += segment["end"] - segment["start"]
+
+    return {"segments": segments, "status_minutes": status_minutes}
+
+class Echo:
+    """
+    File-like object whose write() returns the value, so csv.writer can feed a generator.
+    """
+    def write(self, value):
+        return value
+
+def iter_export_logs(queryset, archived_trips=(), start=None, end=None):
+    """
+    Yields the logs of the queryset in chunks, followed by the logs of the archived trips
+    (read from cold storage one trip at a time, see archive.py).
+
+    Only each part is ordered by date: merging both would need every archive in memory at once.
+    """
+    return itertools.chain(
+        queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+        iter_archived_logs(archived_trips, start, end),
+    )
+
+def stream_logs_csv(logs):
+    """
+    Yields CSV lines: one row per duty status change of every log.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+
+    for log in logs:
+        for event in merge_events(log.events):
+            yield writer.writerow([
+                log.trip.driver_id or "",
+                log.trip_id,
+                log.date.isoformat(),
+                event["start_time"],
+                event["end_time"],
+                event["status"],
+                event["remarks"],
+            ])
+
+def stream_logs_ndjson(logs, include_grid=False):
+    """
+    Yields one JSON line per log, optionally with the pre-computed grid
+    (see build_log_grid) for PDF rendering.
+    """
+    for log in logs:
+        row = {
+            "id": log.id,
+            "driver": log.trip.driver_id,
+            "trip": log.trip_id,
+            "date": log.date,
+            "total_driving": log.total_driving,
+            "total_on_duty": log.total_on_duty,
+            "total_off_duty": log.total_off_duty,
+            "total_sleeper_berth": log.total_sleeper_berth,
+            "events": merge_events(log.events),
+        }
+        if include_grid:
+            row["grid"] = build_log_grid(log.date, log.events)
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+async def aiter_chunks(lines, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Async iterator over the lines of a sync generator (e.g. stream_logs_csv), for
+    StreamingHttpResponse under ASGI. Each chunk of chunk_size lines is produced in the
+    request's sync thread (sync_to_async with thread_sensitive=True), so the database cursor of
+    the export stays on one connection and the response is sent as it is read instead of being
+    buffered in memory first.
+    """
+    lines = iter(lines)
+
+    @sync_to_async(thread_sensitive=True)
+    def next_chunk():
+        return "".join(itertools.islice(lines, chunk_size))
+
+    while chunk := await next_chunk():
+        yield chunk
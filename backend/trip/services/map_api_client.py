@@ -1,8 +1,5 @@
 import os
 import requests
-from dotenv import load_dotenv
-
-load_dotenv()
 
 def geocode_address(address):
     OSM_NOMINATIM_URL = os.getenv("OSM_NOMINATIM_URL", default="")
@@ -44,6 +41,13 @@ def get_route_data(start_address, end_address):
     start_coords = geocode_address(start_address)
     end_coords = geocode_address(end_address)
 
+    return get_route_for_coordinates(start_coords, end_coords)
+
+def get_route_for_coordinates(start_coords, end_coords):
+    """
+    Call OpenRouteService to retrieve the route between two already geocoded
+    [lon, lat] points. Returns the same dictionary as get_route_data.
+    """
     # We need an API key from openrouteservice.org
     ORS_API_KEY = os.getenv("ORS_API_KEY", default="")
     ORS_API_DIRECTIONS_URL = os.getenv("ORS_API_DIRECTIONS_URL", default="")
@@ -84,4 +88,49 @@ def get_route_data(start_address, end_address):
             'geometry': data['metadata']['query']['coordinates']
         }
     else:
-        raise Exception(f"Route calculation failed for start address: {start_address} and end address: {end_address}")
\ No newline at end of file
+        raise Exception(f"Route calculation failed for start coordinates: {start_coords} and end coordinates: {end_coords}")
+
+def get_matrix_data(locations, sources=None, destinations=None):
+    """
+    Call the OpenRouteService matrix endpoint for the given [lon, lat] locations.
+    sources and destinations are lists of indices into locations (default: all).
+
+    Returns a dictionary with:
+      - distances: len(sources) x len(destinations) list of distances in miles (None if unroutable),
+      - durations: same shape, driving time in hours (None if unroutable).
+    """
+    ORS_API_KEY = os.getenv("ORS_API_KEY", default="")
+    ORS_API_MATRIX_URL = os.getenv("ORS_API_MATRIX_URL", default="")
+
+    headers = {
+        'Accept': 'application/json; charset=utf-8',
+        'Authorization': ORS_API_KEY,
+        'Content-Type': 'application/json; charset=utf-8'
+    }
+
+    body = {
+        "locations": locations,
+        "metrics": ["distance", "duration"],
+        "units": "m"
+    }
+    if sources is not None:
+        body["sources"] = sources
+    if destinations is not None:
+        body["destinations"] = destinations
+
+    response = requests.post(ORS_API_MATRIX_URL, json=body, headers=headers)
+    data = response.json()
+
+    if data and 'distances' in data and 'durations' in data:
+        return {
+            'distances': [
+                [None if meters is None else meters / 1609.34 for meters in row]
+                for row in data['distances']
+            ],
+            'durations': [
+                [None if seconds is None else seconds / 3600.0 for seconds in row]
+                for row in data['durations']
+            ],
+        }
+    else:
+        raise Exception(f"Matrix calculation failed for {len(locations)} locations")
@@ -0,0 +1,198 @@
+import datetime
+from zoneinfo import ZoneInfoNotFoundError
+
+from django.db import transaction
+from django.utils import timezone
+from .route_and_hos_service import (
+    BREAK_REMARKS,
+    DAY_RESET_REMARKS,
+    DRIVE_SPEED,
+    FUEL_INTERVAL_MILES,
+    FUELING_REMARKS,
+    RESTART_REMARKS,
+    deserialize_hos_state,
+    get_zone,
+    plan_and_save_trip,
+    resolve_route,
+    simulate_trip,
+)
+from .departure_optimizer import driver_hos_state
+from .driver_scheduler import chain_trips, following_trips, resolve_routes, save_driver_plans
+from .lane_matrix import lane_geometry
+from ..models import DailyLog, Stop
+
+def checkpoint_zone(checkpoint):
+    """
+    Returns the time zone a checkpoint was planned in. Older checkpoints of trips planned for a
+    busy driver hold a fixed offset such as "UTC-05:00" instead of a zone name; that offset is
+    taken from their available_at.
+    """
+    try:
+        return get_zone(checkpoint["timezone"])
+    except (ZoneInfoNotFoundError, ValueError):
+        return datetime.datetime.fromisoformat(checkpoint["hos_state"]["available_at"]).tzinfo
+
+def replay_day(checkpoint, events, until):
+    """
+    Replays the events of one daily log from its checkpoint up to `until`.
+
+    Returns (state, miles_driven, next_fuel_mile, kept_events) where state is the HOS state at
+    `until` and kept_events are the events before `until` (the one in progress is cut at `until`).
+    Returns None if `until` falls inside the off-duty reset that ends the day.
+    """
+    state = deserialize_hos_state(checkpoint["hos_state"])
+    miles_driven = checkpoint["miles_driven"]
+    next_fuel_mile = checkpoint["next_fuel_mile"]
+    kept_events = []
+
+    for event in events:
+        start = datetime.datetime.fromisoformat(event["start_time"])
+        event_end = datetime.datetime.fromisoformat(event["end_time"])
+        if start >= until:
+            break
+        if event["remarks"] in (DAY_RESET_REMARKS, RESTART_REMARKS):
+            return None
+
+        end = min(event_end, until)
+        hours = (end - start).total_seconds() / 3600.0
+
+        if event["status"] == "Driving":
+            state["daily_driving_hours"] += hours
+            state["daily_on_duty_hours"] += hours
+            miles_driven += hours * DRIVE_SPEED
+        elif event["status"] == "On Duty":
+            state["daily_on_duty_hours"] += hours
+            if event["remarks"] == FUELING_REMARKS and end == event_end:
+                next_fuel_mile += FUEL_INTERVAL_MILES
+        else:
+            state["daily_off_duty_hours"] += hours
+            if event["remarks"] == BREAK_REMARKS:
+                state["has_taken_30min_break"] = True
+
+        kept_events.append(dict(event, end_time=end.isoformat()))
+
+    state["available_at"] = until
+    return state, miles_driven, next_fuel_mile, kept_events
+
+def replan_trip(trip, position, at_time=None, use_sleeper_berth=False):
+    """
+    Replans the rest of a trip from a position reported mid-route.
+
+    Completed stops and daily logs are kept. The HOS state at at_time (default: now) is rebuilt
+    from the checkpoint of the current day's log plus that day's events, only the remaining leg
+    from `position` to the dropoff is routed and simulated, and only future rows are rewritten.
+
+    If at_time falls inside a break or fuel stop, the trip resumes when that stop ends.
+    Falls back to a full recalculation from `position` if the pickup is not finished yet or the
+    trip was planned before checkpoints were stored; for a driver's trip, it starts from the
+    driver's state at the start of the trip. Does nothing if the dropoff has already started.
+
+    If the trip is scheduled for a driver, the driver's later trips are chained again from the
+    new end of the trip and Driver.hos_state is updated. Raises ValueError if the route of one of
+    them cannot be resolved; nothing is saved then.
+    """
+    at_time = at_time or timezone.now()
+
+    # A break or fuel stop in progress is finished first, so it keeps its full length.
+    current_stop = trip.stops.filter(
+        stop_type__in=["Break", "Fuel"], start_time__lte=at_time, end_time__gt=at_time
+    ).first()
+    if current_stop is not None:
+        at_time = current_stop.end_time
+
+    pickup = trip.stops.filter(stop_type="Pickup").first()
+    dropoff = trip.stops.filter(stop_type="Dropoff").first()
+    if dropoff is not None and dropoff.start_time <= at_time:
+        return
+
+    driver = trip.driver if trip.driver_id is not None else None
+    driver_timezone = None
+    later_trips, later_routes = [], {}
+    if driver is not None:
+        driver_timezone = driver.timezone or None
+        # Resolved before anything is saved, so a routing failure leaves the schedule as it was.
+        later_trips = following_trips(trip)
+        later_routes, errors = resolve_routes([(driver, later_trips, None)])
+        if errors:
+            raise ValueError("; ".join(errors.values()))
+
+    trip.current_location = position
+    logs = list(trip.logs.order_by('id').only('id', 'checkpoint'))
+    if pickup is None or pickup.end_time > at_time or not all(log.checkpoint for log in logs):
+        route = resolve_route(trip, driver_timezone)
+        hos_state = driver_hos_state(trip)
+        with transaction.atomic():
+            end_state = plan_and_save_trip(trip, route, use_sleeper_berth, at_time, hos_state)
+            save_following_trips(driver, later_trips, later_routes, end_state, use_sleeper_berth)
+        return
+
+    # Find the day in progress at at_time: the last log whose day started before it.
+    index = max(
+        i for i, log in enumerate(logs)
+        if datetime.datetime.fromisoformat(log.checkpoint["hos_state"]["available_at"]) <= at_time
+    )
+    resume_at = at_time
+    replay = replay_day(logs[index].checkpoint, DailyLog.objects.get(pk=logs[index].pk).events, resume_at)
+
+    if replay is None:
+        # The driver is taking the off-duty reset that ends the day, so resume when it is over.
+        index += 1
+        resume_at = datetime.datetime.fromisoformat(logs[index].checkpoint["hos_state"]["available_at"])
+        replay = replay_day(logs[index].checkpoint, [], resume_at)
+
+    current_log = logs[index]
+    hos_state, miles_driven, next_fuel_mile, kept_events = replay
+    zone = checkpoint_zone(current_log.checkpoint)
+    resume_at = resume_at.astimezone(zone)
+    hos_state["available_at"] = resume_at
+
+    # Re-route only the remaining leg.
+    route = resolve_route(trip, driver_timezone)
+
+    plan = simulate_trip(
+        route['distance'],
+        resume_at,
+        trip.pickup_location,
+        trip.dropoff_location,
+        use_sleeper_berth,
+        hos_state,
+        include_pickup=False,
+        miles_driven=miles_driven,
+        next_fuel_mile=next_fuel_mile,
+        timezone_name=getattr(zone, 'key', None),
+    )
+
+    # The first simulated day continues the day in progress; its totals already include the replayed part.
+    first_log = plan['logs'][0]
+    current_log.total_driving = first_log['total_driving']
+    current_log.total_on_duty = first_log['total_on_duty']
+    current_log.total_off_duty = first_log['total_off_duty']
+    current_log.total_sleeper_berth = first_log['total_sleeper_berth']
+    current_log.events = kept_events + first_log['events']
+
+    with transaction.atomic():
+        trip.total_distance = miles_driven + route['distance']
+        trip.estimated_duration = miles_driven / DRIVE_SPEED + route['duration']
+        trip.geometry = lane_geometry(route, trip.geometry)
+        trip.save()
+
+        # Only future rows are rewritten.
+        trip.stops.filter(start_time__gte=resume_at).delete()
+        trip.logs.filter(id__gt=current_log.id).delete()
+        current_log.save(update_fields=['total_driving', 'total_on_duty', 'total_off_duty', 'total_sleeper_berth', 'events'])
+
+        Stop.objects.bulk_create(Stop(trip=trip, **stop) for stop in plan['stops'])
+        DailyLog.objects.bulk_create(DailyLog(trip=trip, **log) for log in plan['logs'][1:])
+
+        save_following_trips(driver, later_trips, later_routes, plan['state'], use_sleeper_berth)
+
+def save_following_trips(driver, trips, routes, hos_state, use_sleeper_berth=False):
+    """
+    Chains the driver's later trips from the HOS state at the end of a replanned trip and stores
+    them with the driver's new HOS state. Does nothing for a trip without a driver.
+    """
+    if driver is None:
+        return
+
+    plans, hos_state = chain_trips(trips, routes, hos_state["available_at"], hos_state, use_sleeper_berth)
+    save_driver_plans([(driver, plans, hos_state)])
@@ -1,61 +1,204 @@
 import datetime
-import pytz
+import functools
+from zoneinfo import ZoneInfo
 
+from django.db import transaction
 from django.utils import timezone
-from timezonefinder import TimezoneFinder
-from .map_api_client import get_route_data
+from .archive import discard_archives
+from .lane_matrix import lane_geometry, lookup_lane
+from .map_api_client import geocode_address, get_route_for_coordinates
 from ..models import DailyLog, Stop
 
-def calculate_trip_stops(trip, driver_timezone=None, use_sleeper_berth=False):
+# Length of the rolling on-duty window used for the 70-hour limit.
+ROLLING_WINDOW = datetime.timedelta(days=8)
+
+# HOS limits count elapsed time. Arithmetic on datetimes in a zoneinfo time zone is wall-clock
+# time, so the simulation runs in UTC and converts to the driver's time zone for dates and display.
+UTC = datetime.timezone.utc
+
+@functools.lru_cache(maxsize=None)
+def get_zone(name):
     """
-    Calculates the stops and daily log entries for a trip using detailed HOS logic based on the
-    Interstate Truck Driver’s Guide. This implementation includes:
-    
-    - Real geocoding of start and destination addresses.
-    - Determination of time zones via timezonefinder. The driver's effective timezone is either
-      provided (driver_timezone) or determined from the start address.
-    - A rolling 70-hour/8-day calculation using actual on-duty period timestamps.
-    - Daily limits: maximum 11 hours of driving within a 14-hour on-duty window.
-    - A 30-minute break after 8 cumulative driving hours.
-    - A sleeper berth option: if enabled, an off-duty reset can be achieved with a 7+3 hour
-      combination (7 consecutive hours in a sleeper plus 3 additional hours off duty) instead of a fixed 10-hour block.
-    - Pickup and drop-off each require 1 hour.
-    - Fuel stops are inserted every 1000 miles.
-    - If the rolling total on-duty hours (across actual timestamps) reaches 70 hours in the preceding 8 days,
-      a full 34-hour restart is enforced.
-    - When crossing time zones, the final dropoff time is converted to the destination's local time.
-    
-    Parameters:
-      trip: Trip model instance (with current_location, pickup_location, dropoff_location, etc.)
-      driver_timezone (optional): a string time zone (e.g., "America/Chicago") provided by the user.
-      use_sleeper_berth (bool): if True, use the sleeper berth option (7+3 off duty) for resets;
-          otherwise use a fixed 10-hour off-duty period.
+    Returns a cached zoneinfo time zone for a name such as "America/Chicago".
     """
+    return ZoneInfo(name)
 
-    tf = TimezoneFinder()
+@functools.lru_cache(maxsize=1)
+def get_timezone_finder():
+    """
+    Returns the shared TimezoneFinder. timezonefinder (and numpy) take a large share of the
+    worker start-up time, so they are imported on first use instead of at module load.
+    """
+    from timezonefinder import TimezoneFinder
+    return TimezoneFinder()
 
-    # 1. Retrieve route info via real geocoding
-    route_info = get_route_data(trip.current_location, trip.dropoff_location)
-    total_distance = route_info['distance']  # miles
-    pure_driving_duration = route_info['duration']  # pure driving hours (without breaks)
-    route_geometry = route_info['geometry']
-    
+def preload_heavy_modules():
+    """
+    Loads the lazily imported dependencies up front, e.g. in a parent process that forks
+    its workers (see PRELOAD_HEAVY_MODULES in settings.py), so the workers share them.
+    """
+    get_timezone_finder()
 
-    # Update Trip model fields
-    trip.total_distance = total_distance
-    trip.estimated_duration = pure_driving_duration
-    trip.geometry = route_geometry
-    trip.save()
+DRIVE_SPEED = 55.0  # Assume an average speed (mph)
+FUEL_INTERVAL_MILES = 1000.0  # Fueling is required every 1000 miles
 
-    # 2) Time zone determination
-    try:
-        # get geocoded coordinates from the map client if available
-        current_route = get_route_data(trip.current_location, trip.current_location)
-        dropoff_route = get_route_data(trip.dropoff_location, trip.dropoff_location)
+# Event remarks that the replanning replay (see replanning.py) relies on.
+BREAK_REMARKS = "30-min break"
+FUELING_REMARKS = "Fueling at city, ST"
+DAY_RESET_REMARKS = "End of day reset"
+RESTART_REMARKS = "34-hour reset (rolling 70hr limit)"
+
+def new_hos_state(start_dt, cycle_hours_used=0.0):
+    """
+    Builds an empty HOS state starting at start_dt. Hours already used in the current
+    70-hour/8-day cycle (e.g. Trip.current_cycle_hours_used) are seeded as a single
+    on-duty period ending at start_dt so they count towards the rolling limit.
+    """
+    on_duty_periods = []
+    cycle_hours_used = float(cycle_hours_used or 0)
+
+    if cycle_hours_used > 0:
+        end = start_dt.astimezone(UTC)
+        on_duty_periods.append((end - datetime.timedelta(hours=cycle_hours_used), end))
+
+    return {
+        "on_duty_periods": on_duty_periods,
+        "current_day": start_dt.date(),
+        "daily_driving_hours": 0.0,
+        "daily_on_duty_hours": 0.0,
+        "daily_off_duty_hours": 0.0,
+        "daily_sleeper_hours": 0.0,
+        "has_taken_30min_break": False,
+        "available_at": start_dt,
+    }
+
+def serialize_hos_state(state):
+    """
+    Converts an HOS state into a JSON-friendly dict (e.g. for Driver.hos_state).
+    On-duty periods older than the rolling window are dropped so the stored state stays small.
+    """
+    cutoff = state["available_at"].astimezone(UTC) - ROLLING_WINDOW
+
+    return {
+        "on_duty_periods": [
+            [start.isoformat(), end.isoformat()]
+            for start, end in state["on_duty_periods"]
+            if end >= cutoff
+        ],
+        "current_day": state["current_day"].isoformat(),
+        "daily_driving_hours": state["daily_driving_hours"],
+        "daily_on_duty_hours": state["daily_on_duty_hours"],
+        "daily_off_duty_hours": state["daily_off_duty_hours"],
+        "daily_sleeper_hours": state["daily_sleeper_hours"],
+        "has_taken_30min_break": state["has_taken_30min_break"],
+        "available_at": state["available_at"].isoformat(),
+    }
+
+def deserialize_hos_state(data):
+    """
+    Inverse of serialize_hos_state. Returns None for an empty dict.
+    """
+    if not data:
+        return None
+
+    return {
+        "on_duty_periods": [
+            (datetime.datetime.fromisoformat(start), datetime.datetime.fromisoformat(end))
+            for start, end in data["on_duty_periods"]
+        ],
+        "current_day": datetime.date.fromisoformat(data["current_day"]),
+        "daily_driving_hours": float(data["daily_driving_hours"]),
+        "daily_on_duty_hours": float(data["daily_on_duty_hours"]),
+        "daily_off_duty_hours": float(data["daily_off_duty_hours"]),
+        "daily_sleeper_hours": float(data["daily_sleeper_hours"]),
+        "has_taken_30min_break": bool(data["has_taken_30min_break"]),
+        "available_at": datetime.datetime.fromisoformat(data["available_at"]),
+    }
+
+def resume_hos_state(state, start_dt):
+    """
+    Carries a previous HOS state forward to start_dt (the start of the next trip).
+
+    - The gap between the end of the previous trip and start_dt is spent off duty.
+    - A gap of 10 hours or more closes the open day: its on-duty hours move into the
+      rolling window and the daily counters and 30-minute break flag are reset.
+    - A gap of 34 hours or more is a full restart and also clears the rolling window.
+
+    Returns a new state; the given state is not modified.
+    """
+    # A deserialized available_at has a fixed UTC offset; the plan continues in start_dt's time zone.
+    available_at = state["available_at"].astimezone(start_dt.tzinfo)
+    state = dict(state, on_duty_periods=list(state["on_duty_periods"]), available_at=available_at)
+
+    if start_dt <= available_at:
+        # The driver is still busy with the previous load, so the next trip starts when they are free.
+        return state
+
+    gap_hours = (start_dt.astimezone(UTC) - available_at.astimezone(UTC)).total_seconds() / 3600.0
+
+    if gap_hours >= 34:
+        state["on_duty_periods"] = []
+    elif gap_hours >= 10:
+        close_day(state)
+    else:
+        state["daily_off_duty_hours"] += gap_hours
+        state["available_at"] = start_dt
+        return state
+
+    state.update(
+        current_day=start_dt.date(),
+        daily_driving_hours=0.0,
+        daily_on_duty_hours=0.0,
+        daily_off_duty_hours=0.0,
+        daily_sleeper_hours=0.0,
+        has_taken_30min_break=False,
+        available_at=start_dt,
+    )
+    return state
+
+def close_day(state):
+    """
+    Moves the on-duty hours of the open day into the rolling on-duty window.
+    """
+    end = state["available_at"].astimezone(UTC)
+    start = end - datetime.timedelta(hours=state["daily_on_duty_hours"])
+    state["on_duty_periods"].append((start, end))
 
-        start_coords = current_route['geometry'][0]
-        dest_coords = dropoff_route['geometry'][0]
+def resolve_route(trip, driver_timezone=None, progress=None):
+    """
+    Geocodes and routes the trip and determines the start, destination and effective time zones.
+    Lanes between configured sites are read from the lane matrix (see lane_matrix.py) instead.
+
+    progress (optional): callable(stage, data) notified with the "geocoded" and "routed" stages.
+
+    Returns a dictionary with:
+      - distance: total distance in miles,
+      - duration: driving time in hours,
+      - geometry: list of [lon, lat] coordinates along the route,
+      - start_tz / dest_tz / effective_tz: time zone names.
+    """
+    progress = progress or (lambda stage, data=None: None)
+
+    # Known lanes come from the precomputed lane matrix without any network I/O.
+    lane = lookup_lane(trip.current_location, trip.dropoff_location, driver_timezone)
+    if lane is not None:
+        progress("geocoded", {"start": lane['geometry'][0], "end": lane['geometry'][-1]})
+        progress("routed", {"distance": lane['distance'], "duration": lane['duration']})
+        return lane
+
+    tf = get_timezone_finder()
+
+    # 1. Real geocoding of the start and destination addresses
+    start_coords = geocode_address(trip.current_location)
+    dest_coords = geocode_address(trip.dropoff_location)
+    progress("geocoded", {"start": start_coords, "end": dest_coords})
 
+    # 2. Retrieve route info
+    route_info = get_route_for_coordinates(start_coords, dest_coords)
+    progress("routed", {"distance": route_info['distance'], "duration": route_info['duration']})
+
+    # 3) Time zone determination from the geocoded coordinates
+    try:
         start_tz_str = tf.timezone_at(lng=start_coords[0], lat=start_coords[1])
         dest_tz_str = tf.timezone_at(lng=dest_coords[0], lat=dest_coords[1])
     except Exception as e:
@@ -65,27 +208,73 @@ def calculate_trip_stops(trip, driver_timezone=None, use_sleeper_berth=False):
 
     # Use the provided driver_timezone if given; otherwise, default to the start location's timezone.
     effective_tz_str = driver_timezone if driver_timezone else start_tz_str
-    effective_tz = pytz.timezone(effective_tz_str)
 
-    # 3) Clear old stops/logs
-    trip.stops.all().delete()
-    trip.logs.all().delete()
+    return {
+        'distance': route_info['distance'],
+        'duration': route_info['duration'],
+        'geometry': route_info['geometry'],
+        'start_tz': start_tz_str,
+        'dest_tz': dest_tz_str,
+        'effective_tz': effective_tz_str,
+    }
+
+def simulate_trip(total_distance, start_dt, pickup_location, dropoff_location, use_sleeper_berth=False, hos_state=None,
+                  record_events=True, include_pickup=True, miles_driven=0.0, next_fuel_mile=FUEL_INTERVAL_MILES,
+                  timezone_name=None):
+    """
+    Runs the HOS simulation for a single trip without touching the database.
+
+    Parameters:
+      total_distance: miles to drive after pickup.
+      start_dt: aware datetime at which the pickup starts (in the driver's effective time zone).
+          Stops, events and log dates are in that time zone; durations are elapsed time.
+      pickup_location / dropoff_location: used for the pickup and dropoff stops.
+      use_sleeper_berth (bool): use the 7+3 sleeper berth reset instead of a fixed 10 hours off duty.
+      hos_state (optional): state returned by a previous simulation (see resume_hos_state).
+          If omitted, the simulation starts with an empty 70-hour/8-day window.
+      record_events (bool): if False, the 15-minute log events are skipped (for what-if sweeps
+          that only need the stops and totals).
+      include_pickup (bool): if False, the simulation starts on the road (used when replanning mid-trip).
+      miles_driven / next_fuel_mile: fuel bookkeeping carried over when replanning mid-trip.
+      timezone_name (optional): name of the driver's effective time zone (e.g. route['effective_tz']),
+          stored in the checkpoints. Defaults to start_dt's tzinfo.
+
+    Returns a dictionary with:
+      - stops: list of dicts with stop_type, location, start_time, end_time,
+      - logs: list of dicts with the DailyLog fields; each log's checkpoint holds the HOS state
+        and fuel bookkeeping at the start of that day,
+      - state: HOS state at the end of the dropoff, to be carried into the next trip,
+      - end_time: dropoff end time,
+      - resets: number of off-duty resets (10-hour/sleeper berth and 34-hour) taken on the way.
+    """
+    if hos_state is None:
+        hos_state = new_hos_state(start_dt)
+    else:
+        hos_state = resume_hos_state(hos_state, start_dt)
+
+    zone = get_zone(timezone_name) if timezone_name else start_dt.tzinfo
 
-    # 4) Start time in local tz
-    current_dt = timezone.now().astimezone(effective_tz)
+    def local(dt):
+        return dt.astimezone(zone)
+
+    current_dt = max(start_dt, hos_state["available_at"]).astimezone(UTC)
+
+    stops = []
+    logs = []
+    resets = 0
 
     # Rolling on-duty periods
-    on_duty_periods = []  # list of (start, end)
-    
+    on_duty_periods = hos_state["on_duty_periods"]  # list of (start, end)
+
     def add_on_duty_period(start, end):
         on_duty_periods.append((start, end))
-    
+
     def compute_rolling_on_duty(current_time):
         """
         Sums the durations (in hours) of on-duty periods that started within the last 8 days
         relative to current_time.
         """
-        cutoff = current_time - datetime.timedelta(days=8)
+        cutoff = current_time - ROLLING_WINDOW
         total = 0.0
 
         for period_start, period_end in on_duty_periods:
@@ -94,55 +283,91 @@ def calculate_trip_stops(trip, driver_timezone=None, use_sleeper_berth=False):
 
         return total
 
-    # 5) Helper: record an event in 15-min increments
+    # Helper: record an event in 15-min increments
     def record_event(event_list, start, end, status, remarks=""):
+        if not record_events:
+            return
         increment = datetime.timedelta(minutes=15)
         block_start = start
         while block_start < end:
             block_end = min(block_start + increment, end)
             event_list.append({
-                "start_time": block_start.isoformat(),
-                "end_time": block_end.isoformat(),
+                "start_time": local(block_start).isoformat(),
+                "end_time": local(block_end).isoformat(),
                 "status": status,
                 "remarks": remarks
             })
             block_start = block_end
 
+    def add_stop(stop_type, location, start, end):
+        stops.append({
+            "stop_type": stop_type,
+            "location": location,
+            "start_time": local(start),
+            "end_time": local(end),
+        })
+
+    def add_log(date, total_driving, total_on_duty, total_off_duty, total_sleeper_berth, events):
+        logs.append({
+            "date": date,
+            "total_driving": total_driving,
+            "total_on_duty": total_on_duty,
+            "total_off_duty": total_off_duty,
+            "total_sleeper_berth": total_sleeper_berth,
+            "events": events,
+            "checkpoint": day_checkpoint,
+        })
+
+    def make_checkpoint():
+        # Snapshot of the simulation at current_dt, so a later replan can resume from here.
+        return {
+            "hos_state": serialize_hos_state({
+                "on_duty_periods": on_duty_periods,
+                "current_day": current_day,
+                "daily_driving_hours": daily_driving_hours,
+                "daily_on_duty_hours": daily_on_duty_hours,
+                "daily_off_duty_hours": daily_off_duty_hours,
+                "daily_sleeper_hours": daily_sleeper_hours,
+                "has_taken_30min_break": has_taken_30min_break,
+                "available_at": local(current_dt),
+            }),
+            "miles_driven": miles_driven,
+            "next_fuel_mile": next_fuel_mile,
+            "timezone": timezone_name or str(zone),
+        }
+
+    def end_on_duty_block(end):
+        # The day's on-duty hours become part of the rolling window once the day is closed.
+        add_on_duty_period(end - datetime.timedelta(hours=daily_on_duty_hours), end)
+
     # Initialize daily events.
     daily_events = []
 
-    # 6) Insert 1-hour pickup (On Duty)
-    pickup_start = current_dt
-    pickup_end = pickup_start + datetime.timedelta(hours=1)
-    Stop.objects.create(
-        trip=trip,
-        stop_type="Pickup",
-        location=trip.pickup_location,
-        start_time=pickup_start,
-        end_time=pickup_end
-    )
-    # We treat "Pickup" as On Duty
-    record_event(daily_events, pickup_start, pickup_end, "On Duty", remarks="Pickup at city, ST")
-    add_on_duty_period(pickup_start, pickup_end)
-    current_dt = pickup_end  # Update time after pickup
-
-    # daily counters
-    current_day = current_dt.date()
-    daily_driving_hours = 0.0
-    daily_on_duty_hours = 1.0  # already 1 hour for pickup
-    daily_off_duty_hours = 0.0
-    daily_sleeper_hours = 0.0
-    # daily_on_duty_start = current_dt  # start time of the current on-duty block for this day
-    
-    miles_driven = 0.0
-    next_fuel_mile = 1000.0  # Fueling is required every 1000 miles
-    drive_speed = 55.0  # Assume an average speed (mph)
-    has_taken_30min_break = False
-    
+    # daily counters (carried over from the previous trip, if any)
+    current_day = hos_state["current_day"]
+    daily_driving_hours = hos_state["daily_driving_hours"]
+    daily_on_duty_hours = hos_state["daily_on_duty_hours"]
+    daily_off_duty_hours = hos_state["daily_off_duty_hours"]
+    daily_sleeper_hours = hos_state["daily_sleeper_hours"]
+    has_taken_30min_break = hos_state["has_taken_30min_break"]
+    day_checkpoint = make_checkpoint()
+
+    # 1) Insert 1-hour pickup (On Duty)
+    if include_pickup:
+        pickup_start = current_dt
+        pickup_end = pickup_start + datetime.timedelta(hours=1)
+        add_stop("Pickup", pickup_location, pickup_start, pickup_end)
+        # We treat "Pickup" as On Duty
+        record_event(daily_events, pickup_start, pickup_end, "On Duty", remarks="Pickup at city, ST")
+        daily_on_duty_hours += 1.0
+        current_dt = pickup_end  # Update time after pickup
+
+    drive_speed = DRIVE_SPEED
+
     # Total miles remaining to drive
     miles_remaining = total_distance
 
-    # 7. Process the driving segments with granular calculations.
+    # 2. Process the driving segments with granular calculations.
     while miles_remaining > 0:
         # Compute current rolling on-duty hours over last 8 days.
         rolling_on_duty = compute_rolling_on_duty(current_dt)
@@ -152,29 +377,32 @@ def calculate_trip_stops(trip, driver_timezone=None, use_sleeper_berth=False):
             # If rolling on-duty exceeds limit, enforce a 34-hour restart.
             off_duty_duration = 34.0
             # End the on-duty block at same time
-            add_on_duty_period(current_dt, current_dt)
+            end_on_duty_block(current_dt)
             # Record the day's log
-            DailyLog.objects.create(
-                trip=trip,
-                date=current_day,
-                total_driving=daily_driving_hours,
-                total_on_duty=daily_on_duty_hours,
-                total_off_duty=daily_off_duty_hours + off_duty_duration,
-                total_sleeper_berth=daily_sleeper_hours,
-                events=daily_events,
+            add_log(
+                current_day,
+                daily_driving_hours,
+                daily_on_duty_hours,
+                daily_off_duty_hours + off_duty_duration,
+                daily_sleeper_hours,
+                daily_events,
             )
 
             # Advance time by the mandatory off-duty period
             record_event(daily_events, current_dt, current_dt + datetime.timedelta(hours=off_duty_duration),
-                         "Off Duty", remarks="34-hour reset (rolling 70hr limit)")
+                         "Off Duty", remarks=RESTART_REMARKS)
             current_dt += datetime.timedelta(hours=off_duty_duration)
-            current_day = current_dt.date()
+            current_day = local(current_dt).date()
             daily_driving_hours = 0.0
             daily_on_duty_hours = 0.0
             daily_off_duty_hours = 0.0
             daily_sleeper_hours = 0.0
             daily_events = []  # reset for new day
             has_taken_30min_break = False
+            resets += 1
+            # A 34-hour restart starts a fresh 70-hour cycle.
+            on_duty_periods.clear()
+            day_checkpoint = make_checkpoint()
             continue
 
         # Determine available time based on daily limits:
@@ -192,35 +420,36 @@ def calculate_trip_stops(trip, driver_timezone=None, use_sleeper_berth=False):
                 off_duty_duration = sleeper_duration + additional_off
             else:
                 off_duty_duration = 10.0
-            
+
             # End the current on-duty period.
-            add_on_duty_period(current_dt, current_dt)
+            end_on_duty_block(current_dt)
             # Record the day's log.
-            DailyLog.objects.create(
-                trip=trip,
-                date=current_day,
-                total_driving=daily_driving_hours,
-                total_on_duty=daily_on_duty_hours,
-                total_off_duty=daily_off_duty_hours + off_duty_duration,
-                total_sleeper_berth=daily_sleeper_hours if use_sleeper_berth else 0,
-                events=daily_events,
+            add_log(
+                current_day,
+                daily_driving_hours,
+                daily_on_duty_hours,
+                daily_off_duty_hours + off_duty_duration,
+                daily_sleeper_hours if use_sleeper_berth else 0,
+                daily_events,
             )
             # Advance time by the off-duty period.
             record_event(daily_events, current_dt, current_dt + datetime.timedelta(hours=off_duty_duration),
-                         "Off Duty", remarks="End of day reset")
+                         "Off Duty", remarks=DAY_RESET_REMARKS)
             current_dt += datetime.timedelta(hours=off_duty_duration)
-            current_day = current_dt.date()
+            current_day = local(current_dt).date()
             daily_driving_hours = 0.0
             daily_on_duty_hours = 0.0
             daily_off_duty_hours = 0.0
             daily_sleeper_hours = 0.0
             daily_events = []  # reset for new day
             has_taken_30min_break = False
+            resets += 1
+            day_checkpoint = make_checkpoint()
             continue
 
         # Determine how many miles can be driven in the effective driving time
         potential_miles = effective_driving_time * drive_speed
-        
+
         # Check if next fuel stop is nearer.
         if miles_driven + potential_miles >= next_fuel_mile:
             miles_to_drive = next_fuel_mile - miles_driven
@@ -249,21 +478,14 @@ def calculate_trip_stops(trip, driver_timezone=None, use_sleeper_berth=False):
             # Insert the 30-minute break and record it. (Off Duty)
             break_start = current_dt
             break_end = current_dt + datetime.timedelta(minutes=30)
+            add_stop("Break", "Rest Area (city, ST)", break_start, break_end)
 
-            Stop.objects.create(
-                trip=trip,
-                stop_type="Break",
-                location="Rest Area (city, ST)",
-                start_time=break_start,
-                end_time=break_end
-            )
-
-            record_event(daily_events, break_start, break_end, "Off Duty", remarks="30-min break")
+            record_event(daily_events, break_start, break_end, "Off Duty", remarks=BREAK_REMARKS)
             current_dt = break_end
             daily_off_duty_hours += 0.5
             has_taken_30min_break = True
             continue  # Recalculate available time after the break
-        
+
         # Record driving event for the current segment.
         drive_start = current_dt
         drive_end = current_dt + datetime.timedelta(hours=drive_time)
@@ -281,50 +503,140 @@ def calculate_trip_stops(trip, driver_timezone=None, use_sleeper_berth=False):
             fuel_start = current_dt
             fuel_duration = 0.25  # 15 minutes
             fuel_end = fuel_start + datetime.timedelta(hours=fuel_duration)
+            add_stop("Fuel", f"Fuel Station near mile {int(miles_driven)}", fuel_start, fuel_end)
 
-            Stop.objects.create(
-                trip=trip,
-                stop_type="Fuel",
-                location=f"Fuel Station near mile {int(miles_driven)}",
-                start_time=fuel_start,
-                end_time=fuel_end
-            )
-
-            record_event(daily_events, fuel_start, fuel_end, "On Duty", remarks="Fueling at city, ST")
+            record_event(daily_events, fuel_start, fuel_end, "On Duty", remarks=FUELING_REMARKS)
             daily_on_duty_hours += fuel_duration
             current_dt = fuel_end
-            next_fuel_mile += 1000  # Set up next fuel stop
-    
-    # 8. After all driving is complete, insert the Dropoff Stop (1 hr, On Duty).
+            next_fuel_mile += FUEL_INTERVAL_MILES  # Set up next fuel stop
+
+    # 3. After all driving is complete, insert the Dropoff Stop (1 hr, On Duty).
     dropoff_start = current_dt
     dropoff_end = dropoff_start + datetime.timedelta(hours=1)
-
-    Stop.objects.create(
-        trip=trip,
-        stop_type="Dropoff",
-        location=trip.dropoff_location,
-        start_time=dropoff_start,
-        end_time=dropoff_end
-    )
+    add_stop("Dropoff", dropoff_location, dropoff_start, dropoff_end)
 
     record_event(daily_events, dropoff_start, dropoff_end, "On Duty", remarks="Dropoff at city, ST")
     daily_on_duty_hours += 1
     current_dt = dropoff_end
-    # end on-duty block
-    add_on_duty_period(dropoff_start, dropoff_end)
-
-    # 9. Record the final day's log with detailed events.
-    DailyLog.objects.create(
-        trip=trip,
-        date=current_day,
-        total_driving=daily_driving_hours,
-        total_on_duty=daily_on_duty_hours,
-        total_off_duty=daily_off_duty_hours,
-        total_sleeper_berth=daily_sleeper_hours,
-        events=daily_events,
+
+    # 4. Record the final day's log with detailed events.
+    add_log(
+        current_day,
+        daily_driving_hours,
+        daily_on_duty_hours,
+        daily_off_duty_hours,
+        daily_sleeper_hours,
+        daily_events,
+    )
+
+    # The day stays open: its on-duty hours are tracked in the daily counters until the next reset.
+    final_state = {
+        "on_duty_periods": on_duty_periods,
+        "current_day": current_day,
+        "daily_driving_hours": daily_driving_hours,
+        "daily_on_duty_hours": daily_on_duty_hours,
+        "daily_off_duty_hours": daily_off_duty_hours,
+        "daily_sleeper_hours": daily_sleeper_hours,
+        "has_taken_30min_break": has_taken_30min_break,
+        "available_at": local(current_dt),
+    }
+
+    return {
+        "stops": stops,
+        "logs": logs,
+        "state": final_state,
+        "end_time": local(current_dt),
+        "resets": resets,
+    }
+
+def save_trip_plan(trip, route, plan):
+    """
+    Stores the route summary on the trip and replaces its stops and daily logs with the simulated plan.
+    """
+    with transaction.atomic():
+        # The new plan replaces an archived one, too.
+        discard_archives([trip])
+
+        # Update Trip model fields
+        trip.total_distance = route['distance']
+        trip.estimated_duration = route['duration']
+        trip.geometry = lane_geometry(route, trip.geometry)
+        trip.save()
+
+        # Clear old stops/logs
+        trip.stops.all().delete()
+        trip.logs.all().delete()
+
+        Stop.objects.bulk_create(Stop(trip=trip, **stop) for stop in plan['stops'])
+        DailyLog.objects.bulk_create(DailyLog(trip=trip, **log) for log in plan['logs'])
+
+def calculate_trip_stops(trip, driver_timezone=None, use_sleeper_berth=False, start_time=None, hos_state=None,
+                         progress=None):
+    """
+    Calculates the stops and daily log entries for a trip using detailed HOS logic based on the
+    Interstate Truck Driver’s Guide. This implementation includes:
+
+    - Real geocoding of start and destination addresses.
+    - Determination of time zones via timezonefinder. The driver's effective timezone is either
+      provided (driver_timezone) or determined from the start address.
+    - A rolling 70-hour/8-day calculation using actual on-duty period timestamps.
+    - Daily limits: maximum 11 hours of driving within a 14-hour on-duty window.
+    - A 30-minute break after 8 cumulative driving hours.
+    - A sleeper berth option: if enabled, an off-duty reset can be achieved with a 7+3 hour
+      combination (7 consecutive hours in a sleeper plus 3 additional hours off duty) instead of a fixed 10-hour block.
+    - Pickup and drop-off each require 1 hour.
+    - Fuel stops are inserted every 1000 miles.
+    - If the rolling total on-duty hours (across actual timestamps) reaches 70 hours in the preceding 8 days,
+      a full 34-hour restart is enforced.
+    - When crossing time zones, the final dropoff time is converted to the destination's local time.
+
+    Parameters:
+      trip: Trip model instance (with current_location, pickup_location, dropoff_location, etc.)
+      driver_timezone (optional): a string time zone (e.g., "America/Chicago") provided by the user.
+      use_sleeper_berth (bool): if True, use the sleeper berth option (7+3 off duty) for resets;
+          otherwise use a fixed 10-hour off-duty period.
+      start_time (optional): aware datetime at which the trip starts; defaults to now.
+      hos_state (optional): HOS state carried over from the driver's previous trip. If omitted,
+          the rolling window is seeded from trip.current_cycle_hours_used.
+      progress (optional): callable(stage, data) notified after each stage
+          ("geocoded", "routed", "simulated", "persisted").
+
+    Returns the HOS state at the end of the trip (see simulate_trip).
+    """
+    route = resolve_route(trip, driver_timezone, progress)
+    return plan_and_save_trip(trip, route, use_sleeper_berth, start_time, hos_state, progress)
+
+def plan_and_save_trip(trip, route, use_sleeper_berth=False, start_time=None, hos_state=None, progress=None):
+    """
+    Simulates and stores a trip whose route has already been resolved (see resolve_route).
+    Returns the HOS state at the end of the trip.
+    """
+    progress = progress or (lambda stage, data=None: None)
+    effective_tz = get_zone(route['effective_tz'])
+
+    # Start time in local tz
+    current_dt = (start_time or timezone.now()).astimezone(effective_tz)
+
+    if hos_state is None:
+        hos_state = new_hos_state(current_dt, trip.current_cycle_hours_used)
+
+    plan = simulate_trip(
+        route['distance'],
+        current_dt,
+        trip.pickup_location,
+        trip.dropoff_location,
+        use_sleeper_berth,
+        hos_state,
+        timezone_name=route['effective_tz'],
     )
+    progress("simulated", {"stops": len(plan['stops']), "logs": len(plan['logs']), "end_time": plan['end_time']})
+
+    save_trip_plan(trip, route, plan)
+    progress("persisted")
+
+    # If the destination is in a different time zone, adjust the final dropoff time.
+    dest_tz = get_zone(route['dest_tz'])
+    final_dropoff_local = plan['end_time'].astimezone(dest_tz)
+    # Optionally, store final_dropoff_local in the trip record.
 
-    # 10. If the destination is in a different time zone, adjust the final dropoff time.
-    dest_tz = pytz.timezone(dest_tz_str)
-    final_dropoff_local = current_dt.astimezone(dest_tz)
-    # Optionally, store final_dropoff_local in the trip record.
\ No newline at end of file
+    return plan['state']
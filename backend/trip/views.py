@@ -1,18 +1,336 @@
+import asyncio
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
-from .models import Trip
-from .serializers import TripSerializer
-from .services.route_and_hos_service import calculate_trip_stops
+from .models import DailyLog, Driver, Trip
+from .serializers import (
+    DailyLogSerializer,
+    DepartureSweepSerializer,
+    DriverScheduleSerializer,
+    DriverSerializer,
+    FleetScheduleSerializer,
+    LogExportSerializer,
+    StopSerializer,
+    TripGeometrySerializer,
+    TripReplanSerializer,
+    TripSerializer,
+)
+from .services.departure_optimizer import optimize_departure
+from .services.driver_scheduler import schedule_fleet
+from .services.archive import rehydrate_trip
+from .services.log_export import aiter_chunks, iter_export_logs, stream_logs_csv, stream_logs_ndjson
+from .services.replanning import replan_trip
+from .services.route_and_hos_service import calculate_trip_stops, resolve_route
 # Create your views here.
+class SubResourcePagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
 class TripViewSet(viewsets.ModelViewSet):
     queryset = Trip.objects.all()
     serializer_class = TripSerializer
 
+    def get_queryset(self):
+        queryset = Trip.objects.all()
+
+        # The sub-resources only need the trip's id and version; they load their own rows.
+        if self.action in ('stops', 'logs'):
+            return queryset.only('id', 'updated_at', 'archived_at')
+        if self.action == 'geometry':
+            return queryset.only('id', 'updated_at', 'archived_at', 'geometry')
+
+        if self.action in ('list', 'retrieve'):
+            fields = self.request.query_params.get('fields')
+            requested = set(fields.split(',')) if fields else {'stops', 'logs'}
+            queryset = queryset.prefetch_related(*(requested & {'stops', 'logs'}))
+
+        return queryset
+
+    def get_object(self):
+        trip = super().get_object()
+
+        # Archived trips are moved back into the hot tables when they are read.
+        if trip.archived_at is not None:
+            rehydrate_trip(trip)
+            trip = super().get_object()
+
+        return trip
+
+    def sub_resource_response(self, request, trip, build):
+        """
+        Returns build() with an ETag and Last-Modified derived from the trip's version and the
+        requested URL, or 304 Not Modified if the client's cached copy is still current.
+        """
+        version = f"{request.get_full_path()}|{trip.updated_at.isoformat()}"
+        etag = quote_etag(hashlib.md5(version.encode()).hexdigest())
+        last_modified = int(trip.updated_at.timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = build()
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+        return response
+
+    def paginated_response(self, request, queryset, serializer_class):
+        paginator = SubResourcePagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = serializer_class(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def geometry(self, request, pk=None):
+        trip = self.get_object()
+        return self.sub_resource_response(
+            request, trip, lambda: Response(TripGeometrySerializer(trip).data)
+        )
+
+    @action(detail=True, methods=['get'])
+    def stops(self, request, pk=None):
+        trip = self.get_object()
+        stops = trip.stops.order_by('start_time', 'id')
+        return self.sub_resource_response(
+            request, trip, lambda: self.paginated_response(request, stops, StopSerializer)
+        )
+
+    @action(detail=True, methods=['get'])
+    def logs(self, request, pk=None):
+        trip = self.get_object()
+        logs = trip.logs.defer('checkpoint').order_by('date', 'id')
+
+        date = request.query_params.get('date')
+        if date:
+            parsed_date = parse_date(date)
+            if parsed_date is None:
+                raise ValidationError({'date': 'Date has wrong format. Use YYYY-MM-DD.'})
+            logs = logs.filter(date=parsed_date)
+
+        return self.sub_resource_response(
+            request, trip, lambda: self.paginated_response(request, logs, DailyLogSerializer)
+        )
+
     @action(detail=True, methods=['post'])
     def calculate_route(self, request, pk=None):
         trip = self.get_object()
         calculate_trip_stops(trip, None, True)
         serializer = TripSerializer(trip)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'])
+    def replan(self, request, pk=None):
+        trip = self.get_object()
+        serializer = TripReplanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        try:
+            replan_trip(trip, data['current_location'], data.get('at_time'), data['use_sleeper_berth'])
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = TripSerializer(trip)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'])
+    def optimize_departure(self, request, pk=None):
+        trip = self.get_object()
+        serializer = DepartureSweepSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        route = resolve_route(trip)
+        result = optimize_departure(
+            trip,
+            route,
+            data['earliest_departure'],
+            data['latest_departure'],
+            data['step_minutes'],
+            data.get('window_start'),
+            data.get('window_end'),
+        )
+        return Response(result, status=status.HTTP_200_OK)
+
+class DriverViewSet(viewsets.ModelViewSet):
+    queryset = Driver.objects.all()
+    serializer_class = DriverSerializer
+
+    def schedule_summary(self, results, failures):
+        """
+        One entry per driver. Drivers that could not be planned keep their previous schedule
+        and list the routing error of each failed trip.
+        """
+        summary = [
+            {
+                'driver': driver.id,
+                'hos_state': driver.hos_state,
+                'trips': [
+                    {
+                        'trip': trip.id,
+                        'start_time': plan['stops'][0]['start_time'],
+                        'end_time': plan['end_time'],
+                    }
+                    for trip, route, plan in plans
+                ],
+                'errors': {},
+            }
+            for driver, plans in results
+        ]
+        summary.extend(
+            {'driver': driver.id, 'hos_state': driver.hos_state, 'trips': [], 'errors': errors}
+            for driver, errors in failures
+        )
+        return summary
+
+    @action(detail=True, methods=['post'])
+    def schedule(self, request, pk=None):
+        driver = self.get_object()
+        serializer = DriverScheduleSerializer(data=request.data, context={'driver': driver})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        trips = data.get('trips')
+        if trips is None:
+            trips = list(driver.trips.order_by('created_at', 'id'))
+
+        results, failures = schedule_fleet([(driver, trips, data.get('start_time'))], data['use_sleeper_berth'])
+        response_status = status.HTTP_400_BAD_REQUEST if failures else status.HTTP_200_OK
+        return Response(self.schedule_summary(results, failures)[0], status=response_status)
+
+    @action(detail=False, methods=['post'])
+    def schedule_batch(self, request):
+        serializer = FleetScheduleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        assignments = [
+            (assignment['driver'], assignment['trips'], assignment.get('start_time'))
+            for assignment in data['assignments']
+        ]
+        results, failures = schedule_fleet(assignments, data['use_sleeper_berth'])
+        return Response(self.schedule_summary(results, failures), status=status.HTTP_200_OK)
+
+class DailyLogViewSet(viewsets.GenericViewSet):
+    queryset = DailyLog.objects.all()
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        serializer = LogExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        logs = (
+            DailyLog.objects
+            .select_related('trip')
+            .only(
+                'id', 'date', 'total_driving', 'total_on_duty', 'total_off_duty',
+                'total_sleeper_berth', 'events', 'trip__id', 'trip__driver_id',
+            )
+            .order_by('date', 'id')
+        )
+        # Archived trips are streamed from cold storage after the hot logs (see iter_export_logs).
+        archived_trips = Trip.objects.filter(archived_at__isnull=False).order_by('id')
+        if 'driver' in data:
+            logs = logs.filter(trip__driver=data['driver'])
+            archived_trips = archived_trips.filter(driver=data['driver'])
+        if 'trip' in data:
+            logs = logs.filter(trip=data['trip'])
+            archived_trips = archived_trips.filter(pk=data['trip'].pk)
+        if 'start' in data:
+            logs = logs.filter(date__gte=data['start'])
+            # Trips archived before the last log date was stored are read to be sure.
+            archived_trips = archived_trips.filter(
+                Q(archived_last_log_date__gte=data['start']) | Q(archived_last_log_date__isnull=True)
+            )
+        if 'end' in data:
+            logs = logs.filter(date__lte=data['end'])
+            # A trip's logs never start before the trip was created.
+            archived_trips = archived_trips.filter(created_at__date__lte=data['end'])
+
+        rows = iter_export_logs(logs, archived_trips.iterator(), data.get('start'), data.get('end'))
+        if data['output'] == 'ndjson':
+            response = StreamingHttpResponse(
+                aiter_chunks(stream_logs_ndjson(rows, data['grid'])), content_type='application/x-ndjson'
+            )
+        else:
+            response = StreamingHttpResponse(aiter_chunks(stream_logs_csv(rows)), content_type='text/csv')
+
+        response['Content-Disposition'] = f'attachment; filename="daily-logs.{data["output"]}"'
+        return response
+
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+def calculate_route_with_summary(trip, use_sleeper_berth, progress):
+    """
+    Runs calculate_trip_stops and returns the final stops and a per-day log summary (without events).
+    """
+    calculate_trip_stops(trip, None, use_sleeper_berth, progress=progress)
+    return {
+        'stops': StopSerializer(trip.stops.order_by('start_time', 'id'), many=True).data,
+        'logs': list(
+            trip.logs.order_by('date', 'id').values(
+                'id', 'date', 'total_driving', 'total_on_duty', 'total_off_duty', 'total_sleeper_berth'
+            )
+        ),
+    }
+
+@require_GET
+async def calculate_route_events(request, pk):
+    """
+    Recalculates the route like TripViewSet.calculate_route, but streams the progress as
+    server-sent events: one event per stage ("geocoded", "routed", "simulated", "persisted"),
+    then "complete" with the stops and the daily log summary, or "error".
+
+    Must be served through an ASGI server (project/asgi.py) to stream without blocking a worker.
+    """
+    try:
+        trip = await Trip.objects.aget(pk=pk)
+    except Trip.DoesNotExist:
+        raise Http404("No Trip matches the given query.")
+
+    use_sleeper_berth = request.GET.get('use_sleeper_berth', 'true').lower() not in ('false', '0')
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def progress(stage, data=None):
+        # Called from the worker thread running the calculation.
+        loop.call_soon_threadsafe(queue.put_nowait, (stage, data or {}))
+
+    async def calculate():
+        try:
+            summary = await sync_to_async(calculate_route_with_summary)(trip, use_sleeper_berth, progress)
+            await queue.put(('complete', summary))
+        except Exception as e:
+            await queue.put(('error', {'detail': str(e)}))
+
+    async def events():
+        task = asyncio.create_task(calculate())
+        try:
+            while True:
+                stage, data = await queue.get()
+                yield server_sent_event(stage, data)
+                if stage in ('complete', 'error'):
+                    break
+        finally:
+            await task
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -55,26 +55,98 @@ interface Trip {
   geometry?: [number, number][];
 }
 
+interface Page<T> {
+  count: number;
+  next: string | null;
+  results: T[];
+}
+
+// The trip details are loaded without the heavy sub-resources, which are fetched separately.
+const TRIP_FIELDS = [
+  'id',
+  'current_location',
+  'pickup_location',
+  'dropoff_location',
+  'name_of_carrier',
+  'main_office_address',
+  'home_terminal_address',
+  'vehicle_number',
+  'manifest_number',
+  'shipper_company',
+  'commodity',
+  'total_distance',
+].join(',');
+
+// Follows the `next` links of a paginated sub-resource and returns all results.
+async function fetchAllPages<T>(url: string): Promise<T[]> {
+  const results: T[] = [];
+  let nextUrl: string | null = url;
+  while (nextUrl) {
+    const resp: { data: Page<T> } = await axios.get(nextUrl);
+    results.push(...resp.data.results);
+    nextUrl = resp.data.next;
+  }
+  return results;
+}
+
 export default function TripDetail() {
   const tripsApiUrl = process.env.NEXT_PUBLIC_TRIPS_API_URL;
 
   const { id } = useParams();
   const [trip, setTrip] = useState<Trip | null>(null);
+  const [stops, setStops] = useState<Stop[]>([]);
+  const [geometry, setGeometry] = useState<[number, number][]>([]);
+  const [logs, setLogs] = useState<DailyLog[] | null>(null);
   const [showPdf, setShowPdf] = useState(false);
 
   const fetchTrip = async () => {
     try {
-      const resp = await axios.get(`${tripsApiUrl}${id}`);
+      const resp = await axios.get(`${tripsApiUrl}${id}/`, {
+        params: { fields: TRIP_FIELDS },
+      });
       setTrip(resp.data);
     } catch (err) {
       console.error(err);
     }
   };
 
+  const fetchRoute = async () => {
+    try {
+      const [geometryResp, stopsList] = await Promise.all([
+        axios.get(`${tripsApiUrl}${id}/geometry/`),
+        fetchAllPages<Stop>(`${tripsApiUrl}${id}/stops/?page_size=1000`),
+      ]);
+      setGeometry(geometryResp.data.geometry || []);
+      setStops(stopsList);
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
+  // Daily logs are only needed for the PDF, so they are loaded on demand.
+  const fetchLogs = async () => {
+    try {
+      const logsList = await fetchAllPages<DailyLog>(
+        `${tripsApiUrl}${id}/logs/?page_size=1000`,
+      );
+      setLogs(logsList);
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
+  const handleShowPdf = () => {
+    setShowPdf(true);
+    fetchLogs();
+  };
+
   const handleCalculate = async () => {
     try {
       await axios.post(`${tripsApiUrl}${id}/calculate_route/`);
+      setLogs(null);
+      setShowPdf(false);
       fetchTrip();
+      fetchRoute();
     } catch (err) {
       console.error(err);
     }
@@ -83,6 +155,7 @@ export default function TripDetail() {
   useEffect(() => {
     if (id) {
       fetchTrip();
+      fetchRoute();
     }
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [id]);
@@ -145,11 +218,11 @@ export default function TripDetail() {
         Calculate Route & HOS
       </button>
 
-      {trip.stops?.length > 0 && (
+      {stops.length > 0 && (
         <div className="mt-4">
           <h3 className="text-lg font-semibold">Stops</h3>
           <ul className="list-inside list-disc space-y-2">
-            {trip.stops.map((stop) => (
+            {stops.map((stop) => (
               <li key={stop.id}>
                 <strong>{stop.stop_type}</strong> at {stop.location} from{' '}
                 {new Date(stop.start_time).toLocaleString()} to{' '}
@@ -162,18 +235,18 @@ export default function TripDetail() {
 
       <div className="mt-4">
         <h3 className="text-lg font-semibold">Route Map</h3>
-        <DynamicRouteMap routeCoordinates={trip.geometry || []} />
+        <DynamicRouteMap routeCoordinates={geometry} />
       </div>
 
       <div className="mt-4">
         <h3 className="text-lg font-semibold">Daily Logs</h3>
         <button
           className="rounded-md bg-green-600 px-4 py-2 text-white hover:bg-green-700"
-          onClick={() => setShowPdf(true)}
+          onClick={handleShowPdf}
         >
           Generate PDF Daily Log
         </button>
-        {showPdf && trip.logs && <DailyLogPdf trip={trip} />}
+        {showPdf && logs && <DailyLogPdf trip={{ ...trip, logs }} />}
       </div>
     </div>
   );